@@ -0,0 +1 @@
+# alfred/backend/benchmarks/__init__.py
\ No newline at end of file
@@ -0,0 +1,154 @@
+# alfred/backend/benchmarks/bench_db_indexes.py
+
+# Measures the hot read queries before and after the index migration.
+# Run from the backend directory:
+#   python -m benchmarks.bench_db_indexes --rows 1000000
+
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+parser = argparse.ArgumentParser(description="Benchmark chat/task/memory queries before and after migrations.")
+parser.add_argument("--rows", type=int, default=1_000_000, help="number of chat_history rows")
+parser.add_argument("--users", type=int, default=200)
+parser.add_argument("--sessions", type=int, default=5, help="sessions per user")
+parser.add_argument("--runs", type=int, default=200, help="queries per measurement")
+args = parser.parse_args()
+
+tmp_dir = tempfile.mkdtemp(prefix="alfred-bench-")
+os.environ["ALFRED_DB_PATH"] = os.path.join(tmp_dir, "bench.db")
+
+from utils import db  # noqa: E402  (must be imported after ALFRED_DB_PATH is set)
+from utils.migrations import migrate, LATEST_VERSION  # noqa: E402
+
+QUERIES = {
+    1: {
+        "load_chat_history (session)": '''
+            SELECT timestamp, role, content FROM chat_history
+            WHERE user_id = ? AND session_id = ? ORDER BY timestamp DESC LIMIT 6
+        ''',
+        "load_chat_history (user)": '''
+            SELECT timestamp, role, content FROM chat_history
+            WHERE user_id = ? ORDER BY timestamp DESC LIMIT 6
+        ''',
+        "get_tasks": '''
+            SELECT id, timestamp, category, task, due_date, recurrence, completed FROM tasks
+            WHERE user_id = ? ORDER BY due_date ASC
+        ''',
+        "load_longterm_memory": '''
+            SELECT timestamp, content, summary, tags FROM longterm_memory
+            WHERE user_id = ? ORDER BY timestamp DESC
+        ''',
+    },
+    LATEST_VERSION: {
+        "load_chat_history (session)": '''
+            SELECT timestamp, role, content FROM chat_history
+            WHERE user_id = ? AND session_id = ? ORDER BY ts DESC LIMIT 6
+        ''',
+        "load_chat_history (user)": '''
+            SELECT timestamp, role, content FROM chat_history
+            WHERE user_id = ? ORDER BY ts DESC LIMIT 6
+        ''',
+        "get_tasks": '''
+            SELECT id, timestamp, category, task, due_date, recurrence, completed FROM tasks
+            WHERE user_id = ? ORDER BY due_ts ASC
+        ''',
+        "load_longterm_memory": '''
+            SELECT timestamp, content, summary, tags FROM longterm_memory
+            WHERE user_id = ? ORDER BY ts DESC
+        ''',
+    },
+}
+
+
+def seed(conn):
+    start = datetime(2024, 1, 1)
+    users = [f"user{u}" for u in range(args.users)]
+
+    def chat_rows():
+        for i in range(args.rows):
+            user = users[i % args.users]
+            session = f"{user}-s{random.randrange(args.sessions)}"
+            ts = (start + timedelta(seconds=i)).isoformat()
+            yield ts, random.choice(("user", "assistant")), f"message {i}", user, session
+
+    def task_rows():
+        for i in range(args.rows // 10):
+            due = start + timedelta(hours=random.randrange(24 * 365))
+            yield start.isoformat(), users[i % args.users], "household", f"task {i}", str(due), "once"
+
+    def memory_rows():
+        for i in range(args.rows // 10):
+            yield (start + timedelta(minutes=i)).isoformat(), users[i % args.users], f"memory {i}", f"summary {i}", "[]"
+
+    conn.execute("BEGIN")
+    conn.executemany(
+        "INSERT INTO chat_history (timestamp, role, content, user_id, session_id) VALUES (?, ?, ?, ?, ?)",
+        chat_rows(),
+    )
+    conn.executemany(
+        "INSERT INTO tasks (timestamp, user_id, category, task, due_date, recurrence) VALUES (?, ?, ?, ?, ?, ?)",
+        task_rows(),
+    )
+    conn.executemany(
+        "INSERT INTO longterm_memory (timestamp, user_id, content, summary, tags) VALUES (?, ?, ?, ?, ?)",
+        memory_rows(),
+    )
+    conn.execute("COMMIT")
+
+
+def params_for(name):
+    user = f"user{random.randrange(args.users)}"
+    if name == "load_chat_history (session)":
+        return user, f"{user}-s{random.randrange(args.sessions)}"
+    return (user,)
+
+
+def measure(conn, version):
+    results = {}
+    for name, sql in QUERIES[version].items():
+        plan = " / ".join(row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params_for(name)))
+        timings = []
+        for _ in range(args.runs):
+            params = params_for(name)
+            t0 = time.perf_counter()
+            conn.execute(sql, params).fetchall()
+            timings.append((time.perf_counter() - t0) * 1000)
+        timings.sort()
+        results[name] = (statistics.median(timings), timings[int(len(timings) * 0.99) - 1], plan)
+    return results
+
+
+def report(title, results):
+    print(f"\n{title}")
+    print(f"{'query':32} {'p50 ms':>10} {'p99 ms':>10}  plan")
+    for name, (p50, p99, plan) in results.items():
+        print(f"{name:32} {p50:10.3f} {p99:10.3f}  {plan}")
+
+
+with db.pool.connection() as conn:
+    migrate(conn, target=1)
+    t0 = time.perf_counter()
+    seed(conn)
+    print(f"Seeded {args.rows:,} chat rows in {time.perf_counter() - t0:.1f}s ({db.DB_PATH})")
+    before = measure(conn, 1)
+
+    t0 = time.perf_counter()
+    migrate(conn)
+    print(f"Migrated to schema v{LATEST_VERSION} in {time.perf_counter() - t0:.1f}s")
+    after = measure(conn, LATEST_VERSION)
+
+report("Schema v1 (no indexes)", before)
+report(f"Schema v{LATEST_VERSION}", after)
+
+db.close_db()
+for suffix in ("", "-wal", "-shm"):
+    try:
+        os.remove(db.DB_PATH + suffix)
+    except FileNotFoundError:
+        pass
+os.rmdir(tmp_dir)
@@ -0,0 +1,93 @@
+# alfred/backend/benchmarks/bench_memory_search.py
+
+# Compares the old get_context retrieval (load every memory, substring filter in Python)
+# with the FTS5 / BM25 search. Run from the backend directory:
+#   python -m benchmarks.bench_memory_search --memories 50000
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+
+parser = argparse.ArgumentParser(description="Benchmark long-term memory retrieval for one user.")
+parser.add_argument("--memories", type=int, default=50_000, help="memories stored for the benchmark user")
+parser.add_argument("--runs", type=int, default=50)
+args = parser.parse_args()
+
+tmp_dir = tempfile.mkdtemp(prefix="alfred-bench-")
+os.environ["ALFRED_DB_PATH"] = os.path.join(tmp_dir, "bench.db")
+
+from utils import db  # noqa: E402  (must be imported after ALFRED_DB_PATH is set)
+from utils.tools import memory_tools  # noqa: E402
+
+memory_tools.DEBUG = False
+
+# A few real topics plus a large synthetic vocabulary, so term frequencies look like a real memory store
+SUBJECTS = ["cat", "dog", "car", "house", "garden", "birthday", "doctor", "school", "job", "recipe",
+            "vacation", "allergy", "medication", "gym", "bank", "plumber", "anniversary", "book", "movie", "band"]
+SUBJECTS += [f"topic{i}" for i in range(3000)]
+VERBS = ["likes", "needs", "visited", "bought", "fixed", "planned", "remembered", "scheduled", "prefers", "hates"]
+QUERIES = ["what medication does my cat take", "when is my anniversary", "who is my plumber",
+           "what car do i drive", "what is my favorite movie", "do i have any allergies"]
+
+
+def old_filter(memories, query):
+    # The substring scan get_context used before the FTS index
+    keywords = set(query.lower().split())
+    filtered = []
+    for mem in memories:
+        combined = f"{mem.get('summary', '')} {' '.join(mem.get('tags', []))}".lower()
+        if any(kw in combined for kw in keywords):
+            filtered.append(mem)
+    return filtered or memories[:3]
+
+
+async def timed(fn):
+    timings = []
+    for _ in range(args.runs):
+        query = random.choice(QUERIES)
+        t0 = time.perf_counter()
+        await fn(query)
+        timings.append((time.perf_counter() - t0) * 1000)
+    timings.sort()
+    return statistics.median(timings), timings[int(len(timings) * 0.99) - 1]
+
+
+async def main():
+    db.init_db()
+    rows = []
+    for i in range(args.memories):
+        subject, other = random.sample(SUBJECTS, 2)
+        text = f"User {random.choice(VERBS)} the {subject} near the {other} ({i})"
+        rows.append((f"2024-01-01T00:00:{i % 60:02d}", i, "bench", text, f"{subject} {other}", json.dumps([subject, other])))
+    t0 = time.perf_counter()
+    db.executemany(
+        "INSERT INTO longterm_memory (timestamp, ts, user_id, content, summary, tags) VALUES (?, ?, ?, ?, ?, ?)",
+        rows,
+    )
+    print(f"Inserted {args.memories:,} memories (FTS kept in sync by triggers) in {time.perf_counter() - t0:.1f}s")
+
+    async def old(query):
+        return old_filter(await memory_tools.load_longterm_memory("bench"), query)
+
+    async def fts(query):
+        return await memory_tools.search_longterm_memory("bench", query)
+
+    print(f"{'retrieval':28} {'p50 ms':>10} {'p99 ms':>10}")
+    for name, fn in (("load all + substring filter", old), ("FTS5 bm25 top-5", fts)):
+        p50, p99 = await timed(fn)
+        print(f"{name:28} {p50:10.3f} {p99:10.3f}")
+
+
+asyncio.run(main())
+db.close_db()
+for suffix in ("", "-wal", "-shm"):
+    try:
+        os.remove(db.DB_PATH + suffix)
+    except FileNotFoundError:
+        pass
+os.rmdir(tmp_dir)
@@ -0,0 +1,68 @@
+# alfred/backend/benchmarks/bench_parse_date.py
+
+# Compares the old parse_date (a new parsedatetime.Calendar per call) with utils.date_parser
+# (regex fast path, shared Calendar, per-day memoization). Run from the backend directory:
+#   python -m benchmarks.bench_parse_date --runs 2000
+
+import argparse
+import statistics
+import time
+from datetime import datetime
+
+import parsedatetime
+
+from utils import date_parser
+
+parser = argparse.ArgumentParser(description="Benchmark natural-language date parsing.")
+parser.add_argument("--runs", type=int, default=2000, help="parses per phrase set")
+args = parser.parse_args()
+
+# What the task node typically sends, plus a few phrases only parsedatetime understands
+PHRASES = [
+    "tomorrow", "today", "tonight", "tomorrow at 8pm", "next wednesday", "friday at 5pm", "sunday",
+    "june 20th", "June 22nd at 8:00", "october 31", "2026-11-02", "2026-11-02 14:30", "in 3 days",
+    "in 2 weeks", "next week", "next month", "tomorrow morning", "in 3 hours",
+]
+
+
+def old_parse_date(text):
+    cal = parsedatetime.Calendar()
+    time_struct, parse_status = cal.parse(text)
+    if parse_status == 0:
+        raise ValueError("Could not parse date")
+    return datetime(*time_struct[:6])
+
+
+def time_per_call(fn, phrases, runs):
+    samples = []
+    for i in range(runs):
+        text = phrases[i % len(phrases)]
+        start = time.perf_counter()
+        fn(text)
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1e6, statistics.mean(samples) * 1e6
+
+
+def uncached(text):
+    date_parser._cache.clear()
+    return date_parser.parse(text)
+
+
+def report(name, p50, mean):
+    print(f"{name:<34} p50 {p50:9.1f}us   mean {mean:9.1f}us")
+
+
+if __name__ == "__main__":
+    fast = [p for p in PHRASES if date_parser._fast_parse(p.lower(), date_parser.now())]
+    print(f"{len(fast)}/{len(PHRASES)} phrases take the regex fast path\n")
+
+    report("old: new Calendar per call", *time_per_call(old_parse_date, PHRASES, args.runs))
+    report("new: uncached, all phrases", *time_per_call(uncached, PHRASES, args.runs))
+    report("new: uncached, fast-path phrases", *time_per_call(uncached, fast, args.runs))
+    date_parser._cache.clear()
+    report("new: memoized", *time_per_call(date_parser.parse, PHRASES, args.runs))
+
+    print("\nphrase                     old                    new")
+    for text in PHRASES:
+        date_parser._cache.clear()
+        print(f"{text:<26} {old_parse_date(text)!s:<22} {date_parser.parse(text)!s}")
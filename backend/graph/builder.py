@@ -2,47 +2,41 @@
 
 from .state import State
 from langgraph.graph import StateGraph, START, END
-from langgraph.prebuilt import ToolNode, tools_condition
 
 from graph.nodes.router_node import router_node
 from graph.nodes.alfred_node import alfred_node
-from graph.nodes.memory_node import memory_node, memory_tools
-from graph.nodes.task_node import task_node, task_tools
-from graph.nodes.weather_node import weather_node, weather_tools
+from graph.nodes.memory_node import memory_node
+from graph.nodes.task_node import task_node
+from graph.nodes.weather_node import weather_node
+
+BRANCH_NODES = ["memory_node", "task_node", "weather_node"]
 
 builder = StateGraph(State)
 
 builder.add_node("router_node", router_node)
 builder.add_node("alfred_node", alfred_node)
 
+# Each branch node calls its LLM and runs its own tools in one step, so every
+# branch is the same length and alfred_node runs once after all of them finish.
 builder.add_node("memory_node", memory_node)
-builder.add_node("memory_tool_node", ToolNode(memory_tools))
-
 builder.add_node("task_node", task_node)
-builder.add_node("task_tool_node", ToolNode(task_tools))
-
 builder.add_node("weather_node", weather_node)
-builder.add_node("weather_tool_node", ToolNode(weather_tools))
+
+def route(state: State) -> list:
+    # The router can pick several branches; LangGraph runs them in parallel
+    branches = [node for node in state.get("next") or [] if node in BRANCH_NODES]
+    return branches or ["alfred_node"]
 
 builder.add_conditional_edges(
     "router_node",
-    lambda state: state.get("next"),
-    {"alfred_node": "alfred_node", 
-     "memory_node": "memory_node",
-     "task_node": "task_node",
-     "weather_node": "weather_node",}
+    route,
+    ["alfred_node"] + BRANCH_NODES,
 )
 
 builder.add_edge(START, "router_node")
-builder.add_edge("memory_node", "memory_tool_node")
-builder.add_edge("memory_tool_node", "alfred_node")
-
-builder.add_edge("task_node", "task_tool_node")
-builder.add_edge("task_tool_node", "alfred_node")
-
-builder.add_edge("weather_node", "weather_tool_node")
-builder.add_edge("weather_tool_node", "alfred_node")
+for node in BRANCH_NODES:
+    builder.add_edge(node, "alfred_node")
 
 builder.add_edge("alfred_node", END)
 
-graph = builder.compile()
\ No newline at end of file
+graph = builder.compile()
@@ -1,21 +1,20 @@
 # alfred/backend/graph/nodes/alfred_node.py
 from graph.state import State
-from utils.tools.chat_tools import load_chat_history
+from utils.context import build_messages
+from utils.date_parser import now
+from utils import models
 
-from langchain_openai import ChatOpenAI
 from langchain.schema import SystemMessage
 
-import os
-from datetime import datetime
 
 DEBUG = True
 
-llm = ChatOpenAI(model=os.getenv("OPENAI_MODEL"))
+llm = models.openai()
 
-def alfred_node(state: State):
+async def alfred_node(state: State):
     user_id = state.get("user_id").lower()
     session_id = state.get("session_id").lower()
-    today = datetime.now()
+    today = now()
     system_prompt = f"""
         Your name is Alfred. You are a personal assistant digital butler. You are always kind and courteous.
         You are sometimes friendly sarcastic. 
@@ -29,18 +28,12 @@ def alfred_node(state: State):
             Saturday, June 14th - Wash the dog
 
     """
-    chat_history = load_chat_history(user_id, session_id, 6)
-    if DEBUG:
-        print(f"ALFRED NODE CHAT HISTORY: {chat_history}")
     system_msg = SystemMessage(content=system_prompt)
-    all_messages = state["messages"]
-    if DEBUG:
-        print(f"ALFRED NODE STATE INPUT: {all_messages}")
-
-    messages = [system_msg] + chat_history + all_messages
+    # Summary of older turns + recent history within the token budget + this turn's (condensed) messages
+    messages = [system_msg] + await build_messages(user_id, session_id, state["messages"])
     if DEBUG:
         print(f"ALFRED STATE: {messages}")
 
-    reply = llm.invoke(messages)
+    reply = await llm.ainvoke(messages)
 
     return {"messages": [{"role": "assistant", "content": reply.content}]}
\ No newline at end of file
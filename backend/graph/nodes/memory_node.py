@@ -1,10 +1,12 @@
 # alfred/backend/graph/nodes/task_node.py
 
 import os
-from langchain_openai import ChatOpenAI
-from langchain_ollama import ChatOllama
 from langchain_core.messages import SystemMessage
+from langchain_core.runnables import RunnableConfig
+from langgraph.prebuilt import ToolNode
 from graph.state import State
+from utils import models
+from utils.inference import ollama_queue, INTERACTIVE
 from utils.tools.task_tools import get_tasks
 from utils.tools.memory_tools import save_longterm_memory, get_context
 
@@ -13,12 +15,14 @@ DEBUG = True
 default_location = os.getenv("LOCATION")
 memory_tools = [get_tasks, save_longterm_memory, get_context]
 
-#llm = ChatOpenAI(model=os.getenv("OPENAI_MODEL"))
-llm = ChatOllama(model=os.getenv("OLLAMA_MODEL"))
+#llm = models.openai()
+llm = models.ollama()
 print(f"OLLAMA MODEL: {llm}")
 llm_with_tools = llm.bind_tools(memory_tools)
+# Tools run inside the node so parallel branches each execute only their own tool calls
+tool_node = ToolNode(memory_tools)
 
-def memory_node(state: State):
+async def memory_node(state: State, config: RunnableConfig):
     print(f"MEMORY NODE STATE: {state}")
 
     user_id = state.get("user_id").lower().strip()
@@ -45,8 +49,10 @@ def memory_node(state: State):
         user_id: str
     """)
 
-    response = llm_with_tools.invoke([sys_msg] + state["messages"])
+    response = await ollama_queue.run(INTERACTIVE, llm_with_tools.ainvoke, [sys_msg] + state["messages"])
     if DEBUG:
         print(f"TASK AGENT RESPONSE: {response.content}")
-    new_messages = state["messages"] + [response]
+    new_messages = [response]
+    if response.tool_calls:
+        new_messages += (await tool_node.ainvoke({"messages": [response]}, config))["messages"]
     return {"messages": new_messages}
\ No newline at end of file
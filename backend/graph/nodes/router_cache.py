@@ -0,0 +1,73 @@
+# alfred/backend/graph/nodes/router_cache.py
+
+# Remembers LLM router decisions (lists of node names) keyed on a normalized prompt, so repeat intents
+# ("what's the weather today", "weather today?") skip the Ollama call.
+# An in-memory LRU sits in front of the router_cache table, which keeps decisions
+# across restarts.
+
+import os
+import re
+
+from utils import db
+from utils.cache import TTLCache
+
+DEBUG = True
+
+CACHE_TTL = int(os.getenv("ROUTER_CACHE_TTL") or 7 * 24 * 3600)
+CACHE_SIZE = 5000
+
+STOPWORDS = frozenset("""
+    a an the is are am was be it its this that to of for on in at my me i you your
+    please can could would will do does whats what's hey alfred so just
+""".split())
+
+_PUNCTUATION_RE = re.compile(r"[^\w\s]")
+
+LOOKUP_SQL = "SELECT decision FROM router_cache WHERE prompt_key = ? AND created_ts >= ?"
+UPSERT_SQL = '''
+    INSERT INTO router_cache (prompt_key, decision, created_ts) VALUES (?, ?, ?)
+    ON CONFLICT (prompt_key) DO UPDATE SET decision = excluded.decision, created_ts = excluded.created_ts
+'''
+PRUNE_SQL = "DELETE FROM router_cache WHERE created_ts < ?"
+RECENT_SQL = "SELECT prompt_key, decision FROM router_cache WHERE created_ts >= ? ORDER BY created_ts DESC LIMIT ?"
+
+_memory = TTLCache(CACHE_SIZE, CACHE_TTL)
+
+
+def normalize(prompt: str) -> str:
+    text = _PUNCTUATION_RE.sub("", prompt.lower())
+    words = [w for w in text.split() if w not in STOPWORDS]
+    return " ".join(words) or text.strip()
+
+
+def _cutoff() -> int:
+    return db.now_ms() - CACHE_TTL * 1000
+
+
+async def get(prompt: str):
+    key = normalize(prompt)
+    decision = _memory.get(key)
+    if decision is not None:
+        return list(decision)
+    row = await db.afetchone(LOOKUP_SQL, (key, _cutoff()))
+    if row is None:
+        return None
+    decision = tuple(row["decision"].split(","))
+    _memory.set(key, decision)
+    return list(decision)
+
+
+async def put(prompt: str, decision: list):
+    key = normalize(prompt)
+    _memory.set(key, tuple(decision))
+    await db.aexecute(UPSERT_SQL, (key, ",".join(decision), db.now_ms()))
+
+
+def warm():
+    """Drop expired decisions and load the most recent ones into memory. Called at startup."""
+    db.execute(PRUNE_SQL, (_cutoff(),))
+    rows = db.fetchall(RECENT_SQL, (_cutoff(), CACHE_SIZE))
+    for row in reversed(rows):
+        _memory.set(row["prompt_key"], tuple(row["decision"].split(",")))
+    if DEBUG:
+        print(f"ROUTER CACHE WARMED WITH {len(rows)} DECISIONS")
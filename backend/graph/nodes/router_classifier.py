@@ -0,0 +1,224 @@
+# alfred/backend/graph/nodes/router_classifier.py
+
+# Local fast path for router_node: keyword rules first, then a small TF-IDF +
+# logistic regression model trained from router_data/train.jsonl. Only messages
+# neither can label confidently go to the LLM router.
+#
+#   python -m graph.nodes.router_classifier train   # retrain and save router_model.json
+#   python -m graph.nodes.router_classifier eval    # accuracy / coverage on router_data/eval.jsonl
+
+import json
+import math
+import os
+import random
+import re
+import sys
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "router_data")
+TRAIN_PATH = os.path.join(DATA_DIR, "train.jsonl")
+EVAL_PATH = os.path.join(DATA_DIR, "eval.jsonl")
+MODEL_PATH = os.path.join(DATA_DIR, "router_model.json")
+
+LABELS = ["alfred_node", "memory_node", "weather_node", "task_node"]
+CONFIDENCE_THRESHOLD = float(os.getenv("ROUTER_CONFIDENCE") or 0.7)
+
+TOKEN_RE = re.compile(r"[a-z0-9']+")
+# Where a multi-part request ("what's the weather and what's on my list?") splits into clauses
+CLAUSE_SPLIT_RE = re.compile(r"\s*(?:[?;]|,?\s+\b(?:and also|and then|and|also|plus)\b)\s*")
+
+# High precision patterns only; anything fuzzy is left to the model.
+RULES = {
+    "weather_node": re.compile(
+        r"\b(weather|forecast|temperature|rain(ing|y)?|snow(ing|y)?|humid(ity)?|sunny|windy|umbrella|storm(s|y)?)\b"
+    ),
+    "task_node": re.compile(
+        # "remind me what my cat's name is" is a memory question, so only reminder-setting phrasing counts
+        r"\bremind me (to|at|in|on|by|every|tomorrow|tonight|next)\b|\b(to-?do|chores?|tasks?)\b"
+        r"|\b(add|create|schedule)\b.+\b(every|daily|weekly|monthly|tomorrow|tonight|on (mon|tues|wednes|thurs|fri|satur|sun)day)\b"
+    ),
+    "memory_node": re.compile(
+        r"\b(remember|recall|long ?term memory|what do you know about me)\b"
+        r"|\bwhat('s| is| are) my\b"
+    ),
+}
+
+
+def tokenize(text: str) -> list:
+    tokens = TOKEN_RE.findall(text.lower())
+    return tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+
+
+def match_rules(text: str) -> list:
+    text = text.lower()
+    return [label for label, pattern in RULES.items() if pattern.search(text)]
+
+
+class IntentModel:
+    def __init__(self, labels: list, idf: dict, weights: dict, bias: list):
+        self.labels = labels
+        self.idf = idf
+        self.weights = weights
+        self.bias = bias
+
+    def _features(self, text: str) -> dict:
+        counts = {}
+        for token in tokenize(text):
+            if token in self.idf:
+                counts[token] = counts.get(token, 0) + 1
+        features = {token: count * self.idf[token] for token, count in counts.items()}
+        norm = math.sqrt(sum(v * v for v in features.values())) or 1.0
+        return {token: v / norm for token, v in features.items()}
+
+    def _probabilities(self, features: dict) -> list:
+        scores = list(self.bias)
+        for token, value in features.items():
+            for i, w in enumerate(self.weights[token]):
+                scores[i] += w * value
+        top = max(scores)
+        exps = [math.exp(s - top) for s in scores]
+        total = sum(exps)
+        return [e / total for e in exps]
+
+    def predict(self, text: str) -> tuple:
+        probs = self._probabilities(self._features(text))
+        best = max(range(len(probs)), key=probs.__getitem__)
+        return self.labels[best], probs[best]
+
+    @classmethod
+    def train(cls, examples: list, epochs: int = 100, lr: float = 0.5, l2: float = 3e-3, seed: int = 7):
+        labels = list(LABELS)
+        docs = [set(tokenize(ex["text"])) for ex in examples]
+        df = {}
+        for doc in docs:
+            for token in doc:
+                df[token] = df.get(token, 0) + 1
+        n = len(examples)
+        idf = {token: math.log((1 + n) / (1 + count)) + 1 for token, count in df.items()}
+        model = cls(labels, idf, {token: [0.0] * len(labels) for token in idf}, [0.0] * len(labels))
+
+        data = [(model._features(ex["text"]), labels.index(ex["label"])) for ex in examples]
+        rng = random.Random(seed)
+        for _ in range(epochs):
+            rng.shuffle(data)
+            for features, target in data:
+                probs = model._probabilities(features)
+                for i, p in enumerate(probs):
+                    grad = p - (1.0 if i == target else 0.0)
+                    model.bias[i] -= lr * grad
+                    for token, value in features.items():
+                        w = model.weights[token]
+                        w[i] -= lr * (grad * value + l2 * w[i])
+        return model
+
+    def save(self, path: str = MODEL_PATH):
+        with open(path, "w") as f:
+            json.dump({
+                "labels": self.labels,
+                "idf": {t: round(v, 5) for t, v in self.idf.items()},
+                "weights": {t: [round(w, 5) for w in ws] for t, ws in self.weights.items()},
+                "bias": [round(b, 5) for b in self.bias],
+            }, f, separators=(",", ":"), sort_keys=True)
+
+    @classmethod
+    def load(cls, path: str = MODEL_PATH):
+        with open(path) as f:
+            data = json.load(f)
+        return cls(data["labels"], data["idf"], data["weights"], data["bias"])
+
+
+def load_examples(path: str) -> list:
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+_model = None
+
+
+def get_model() -> IntentModel:
+    global _model
+    if _model is None:
+        if os.path.exists(MODEL_PATH):
+            _model = IntentModel.load()
+        else:
+            _model = IntentModel.train(load_examples(TRAIN_PATH))
+            _model.save()
+    return _model
+
+
+def classify(text: str, threshold: float = CONFIDENCE_THRESHOLD) -> tuple:
+    """
+    Return (label, confidence, source) where source is "rule" or "model",
+    or (None, confidence, None) when the LLM router should decide.
+    """
+    matched = match_rules(text)
+    if len(matched) == 1:
+        return matched[0], 1.0, "rule"
+
+    label, confidence = get_model().predict(text)
+    if matched and label not in matched:
+        # Rules and model disagree; let the LLM settle it
+        return None, confidence, None
+    if confidence >= threshold:
+        return label, confidence, "model"
+    return None, confidence, None
+
+
+def classify_intents(text: str, threshold: float = CONFIDENCE_THRESHOLD) -> tuple:
+    """
+    Multi-intent version of classify: each clause of the message is classified on its own
+    and the branch labels are combined. Returns (labels, confidence, source), or
+    (None, confidence, None) if any clause needs the LLM router.
+    alfred_node is only returned on its own, since it always runs last anyway.
+    """
+    clauses = [c for c in CLAUSE_SPLIT_RE.split(text) if c and c.strip()]
+    if len(clauses) <= 1:
+        label, confidence, source = classify(text, threshold)
+        return ([label] if label else None), confidence, source
+
+    labels = []
+    lowest = 1.0
+    sources = set()
+    for clause in clauses:
+        label, confidence, source = classify(clause, threshold)
+        lowest = min(lowest, confidence)
+        if label is None:
+            return None, lowest, None
+        sources.add(source)
+        if label != "alfred_node" and label not in labels:
+            labels.append(label)
+    return (labels or ["alfred_node"]), lowest, ("rule" if sources == {"rule"} else "model")
+
+
+def evaluate(path: str = EVAL_PATH, threshold: float = CONFIDENCE_THRESHOLD) -> dict:
+    examples = load_examples(path)
+    covered = correct = 0
+    misses = []
+    for ex in examples:
+        labels, _, _ = classify_intents(ex["text"], threshold)
+        if labels is None:
+            continue
+        covered += 1
+        if labels == [ex["label"]]:
+            correct += 1
+        else:
+            misses.append((ex["text"], ex["label"], labels))
+    return {
+        "examples": len(examples),
+        "fast_path_coverage": covered / len(examples),
+        "fast_path_accuracy": correct / covered if covered else None,
+        "misses": misses,
+    }
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "eval"
+    if command == "train":
+        IntentModel.train(load_examples(TRAIN_PATH)).save()
+        print(f"Saved router model to {MODEL_PATH}")
+    results = evaluate()
+    print(f"Eval examples:       {results['examples']}")
+    print(f"Fast path coverage:  {results['fast_path_coverage']:.1%}")
+    if results["fast_path_accuracy"] is not None:
+        print(f"Fast path accuracy:  {results['fast_path_accuracy']:.1%}")
+    for text, expected, got in results["misses"]:
+        print(f"  MISS: {text!r} expected {expected}, got {got}")
@@ -1,23 +1,27 @@
 # alfred/backend/graph/nodes/router_node.py
 from graph.state import State
-from langchain_openai import ChatOpenAI
-from langchain_community.chat_models import ChatOllama
-import os
+from graph.nodes.router_classifier import LABELS, classify_intents
+from graph.nodes import router_cache
+from utils import metrics, models
+from utils.inference import ollama_queue, ROUTER
+import re
 import time
 
 DEBUG = True
 
-#llm = ChatOpenAI(model=os.getenv("OPENAI_MODEL"))
-llm = ChatOllama(model=os.getenv("OLLAMA_MODEL"))
+#llm = models.openai()
+llm = models.ollama()
 
 system_prompt = """
-        You are a fine tuned router. You will take the input and decide whether it should be routed to:
+        You are a fine tuned router. You will take the input and decide which of these nodes it should be routed to:
         alfred_node - if the response requires chit chat or general knowledge trained in gpt.
         memory_node - if the response requires any recall of memory or information about the user.
         weather_node - if the response requires information about current or forecast weather.
         task_node - if the user input needs any kind of task management: create a task, delete a task, edit a task, mark a task as completed.
             - in addition, task node can handle reminders and scheduling.
-        ONLY respond with one of the following:
+        If the input asks for more than one thing, respond with every node needed, separated by commas
+        (e.g. weather_node, task_node).
+        ONLY respond with one or more of the following:
             - alfred_node
             - memory_node
             - weather_node
@@ -25,20 +29,49 @@ system_prompt = """
         DO NOT respond with any other words besides the ones above.
         
 """
-def router_node(state: State):
+def parse_decision(reply: str) -> list:
+    """Pull the valid node names out of the router reply, in order, without duplicates."""
+    found = re.findall(r"\b(" + "|".join(LABELS) + r")\b", reply)
+    branches = [label for label in dict.fromkeys(found) if label != "alfred_node"]
+    return branches or (["alfred_node"] if found else [])
+
+async def router_node(state: State):
+    start = time.perf_counter()
     if DEBUG:
-        start = time.perf_counter()
         print("DEBUG: Starting router node.")
     last_message = state["messages"][-1].content.lower()
-    decision = llm.invoke([
-        {"role": "system", "content": system_prompt},
-        last_message
-    ]).content.strip()
+
+    # Fast path: keyword rules / local model, LLM only when they aren't confident
+    decision, confidence, source = classify_intents(last_message)
+    if decision is None:
+        decision = await router_cache.get(last_message)
+        source = "cache"
+    if decision is None:
+        source = "llm"
+        reply = (await ollama_queue.run(ROUTER, llm.ainvoke, [
+            {"role": "system", "content": system_prompt},
+            last_message
+        ])).content
+        decision = parse_decision(reply)
+        if decision:
+            await router_cache.put(last_message, decision)
+        else:
+            print(f"ROUTER RETURNED UNKNOWN NODE: {reply}")
+            decision = ["alfred_node"]
+
+    duration = time.perf_counter() - start
+    metrics.incr(f"router.{source}")
+    metrics.observe(f"router.{source}", duration)
     if DEBUG:
-        duration = time.perf_counter() - start
-        print(f"ROUTER NODE TOOK {duration:.2f}s")
+        print(f"ROUTER NODE TOOK {duration:.4f}s ({source}, confidence {confidence:.2f})")
     print(f"ROUTER DECISION: {decision}")
-    return {"next": decision.strip("'")}
-
+    return {"next": decision}
 
-    
\ No newline at end of file
+def router_stats() -> dict:
+    fast = metrics.counter("router.rule") + metrics.counter("router.model") + metrics.counter("router.cache")
+    total = fast + metrics.counter("router.llm")
+    return {
+        "decisions": total,
+        "fast_path_hits": fast,
+        "fast_path_hit_rate": fast / total if total else None,
+    }
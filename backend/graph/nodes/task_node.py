@@ -2,29 +2,33 @@
 
 import os
 import time
-from langchain_openai import ChatOpenAI
-from langchain_ollama import ChatOllama
 from langchain_core.messages import SystemMessage
+from langchain_core.runnables import RunnableConfig
+from langgraph.prebuilt import ToolNode
 from graph.state import State
+from utils import models
 from utils.tools.task_tools import create_new_task, get_tasks, mark_task_completed
 from utils.tools.location_date_tools import parse_date
-from datetime import datetime
+from utils.date_parser import now
 
 DEBUG = True
 
 default_location = os.getenv("LOCATION")
 task_tools = [create_new_task, get_tasks, mark_task_completed, parse_date]
 
-llm = ChatOpenAI(model=os.getenv("OPENAI_MODEL"))
-#llm = ChatOllama(model=os.getenv("OLLAMA_MODEL"))
+llm = models.openai()
+#llm = models.ollama()
 llm_with_tools = llm.bind_tools(task_tools)
-today = datetime.now()
+# Tools run inside the node so parallel branches each execute only their own tool calls
+tool_node = ToolNode(task_tools)
 
-def task_node(state: State):
+async def task_node(state: State, config: RunnableConfig):
     start = time.perf_counter()
     print(f"TASK NODE STATE: {state}")
 
     user_id = state.get("user_id").lower().strip()
+    # Computed per call (not at import) so "today" is never stale, and in ALFRED_TIMEZONE when set
+    today = now()
 
     sys_msg = SystemMessage(content=f"""
     You are a helpful assistant expert in task management. You will help the user create tasks, retrieve a list of tasks,
@@ -44,14 +48,18 @@ def task_node(state: State):
         category: str (available categories: houshold cleaning, household maintenance, lawncare, laundry, pet_care, personal_care)
         task: str
         date: str (e.g. 'tomorrow', 'thursday', 'june 20th', 'next wednesday', June 22nd at 8:00)
-        recurrence: str (e.g. 'once', 'daily', 'weekly', 'monthly', 'bi-weekly')
+        recurrence: str (e.g. 'once', 'daily', 'weekly', 'monthly', 'bi-weekly', 'every 3 days', 'every monday and thursday', 'weekdays')
         notes: str | None
-    get_tasks: user_id: str
+    get_tasks: user_id: str, status: str ('open' (default), 'completed', 'all'), due_after: str, due_before: str
+        (e.g. 'today', 'sunday'; use both for a window like this week), category: str, limit: int, cursor: str
+        Only pass the filters the prompt asks for. If the result has a next_cursor and the user wants more, call again with it.
     mark_task_completed: user_id: str, query: str
     """)
 
-    response = llm_with_tools.invoke([sys_msg] + state["messages"])
-    new_messages = state["messages"] + [response]
+    response = await llm_with_tools.ainvoke([sys_msg] + state["messages"])
+    new_messages = [response]
+    if response.tool_calls:
+        new_messages += (await tool_node.ainvoke({"messages": [response]}, config))["messages"]
 
     if DEBUG:
         print(f"TASK AGENT RESPONSE: {response.content}")
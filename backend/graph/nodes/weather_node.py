@@ -2,10 +2,12 @@
 
 import os
 import time
-from langchain_openai import ChatOpenAI
-from langchain_ollama import ChatOllama
 from langchain_core.messages import SystemMessage
+from langchain_core.runnables import RunnableConfig
+from langgraph.prebuilt import ToolNode
 from graph.state import State
+from utils import models
+from utils.inference import ollama_queue, INTERACTIVE
 from utils.tools.weather_tools import get_current_weather, get_forecast_weather
 
 DEBUG = True
@@ -13,22 +15,26 @@ DEBUG = True
 default_location = os.getenv("LOCATION")
 weather_tools = [get_current_weather, get_forecast_weather]
 
-#llm = ChatOpenAI(model=os.getenv("OPENAI_MODEL"))
-llm = ChatOllama(model=os.getenv("OLLAMA_MODEL"))
+#llm = models.openai()
+llm = models.ollama()
 llm_with_tools = llm.bind_tools(weather_tools)
+# Tools run inside the node so parallel branches each execute only their own tool calls
+tool_node = ToolNode(weather_tools)
 
 sys_msg = SystemMessage(content=f"""
     You are a helpful assistant tasked with retrieving weather information: current or forecast.
     If no location is given, default to {default_location}.
     """)
 
-def weather_node(state: State):
+async def weather_node(state: State, config: RunnableConfig):
     if DEBUG:
         start = time.perf_counter()
         print(f"WEATHER NODE STATE: {state}")
 
-    response = llm_with_tools.invoke([sys_msg] + state["messages"])
-    new_messages = state["messages"] + [response]
+    response = await ollama_queue.run(INTERACTIVE, llm_with_tools.ainvoke, [sys_msg] + state["messages"])
+    new_messages = [response]
+    if response.tool_calls:
+        new_messages += (await tool_node.ainvoke({"messages": [response]}, config))["messages"]
 
     if DEBUG:
         duration = time.perf_counter() - start
@@ -6,4 +6,5 @@ from langgraph.graph.message import add_messages
 class State(TypedDict, total=False):
     messages: Annotated[list, add_messages]
     user_id: str
-    session_id: str
\ No newline at end of file
+    session_id: str
+    next: list
\ No newline at end of file
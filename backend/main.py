@@ -4,16 +4,26 @@ from dotenv import load_dotenv
 load_dotenv()
 
 import asyncio
+import json
 import time
-from fastapi import FastAPI, Query, HTTPException
+from fastapi import FastAPI, Query, HTTPException, Request, Response
+from fastapi.responses import StreamingResponse, JSONResponse
 from pydantic import BaseModel
 from fastapi.middleware.cors import CORSMiddleware
 import traceback
+from contextlib import asynccontextmanager
 from langchain_core.messages import AIMessage, SystemMessage, HumanMessage
-from utils.db import init_db
-from utils.tools.chat_tools import load_chat_history, save_chat
-from utils.tools.memory_tools import check_for_longterm_storage
+from utils.db import init_db, close_db
+from utils.http import close_client
+from utils.scheduler import reminders
+from utils.inference import ollama_queue, Overloaded
+from utils.tools.location_date_tools import preload_default_location
+from utils.tools.chat_tools import save_chat, chat_writer, latest_chat_id, history_page
+from utils.memory_classifier import memory_classifier
 from graph.builder import graph as workflow
+from graph.nodes.router_node import router_stats
+from graph.nodes import router_cache
+from utils import metrics, models
 import logging
 
 logging.basicConfig(level=logging.INFO)
@@ -26,8 +36,26 @@ logging.getLogger("httpx").setLevel(logging.WARNING)
 
 DEBUG = True
 
-app = FastAPI()
-init_db()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    init_db()
+    # Load the Ollama models in the background; GET /ready reports when they're resident
+    await models.warm_up()
+    router_cache.warm()
+    await chat_writer.start()
+    await preload_default_location()
+    await reminders.start()
+    await memory_classifier.start()
+    yield
+    await memory_classifier.stop()
+    await reminders.stop()
+    # Drain pending chat rows before the connection pool goes away
+    await chat_writer.stop()
+    await close_client()
+    await models.close()
+    close_db()
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -49,30 +77,48 @@ class ChatResponse(BaseModel):
     class Config:
         arbitrary_types_allowed = True
 
+GRAPH_CONFIG = {"recursion_limit": 8}
+
+def build_state(request: ChatRequest) -> dict:
+    return {
+        "messages": [HumanMessage(content=request.content)],
+        "user_id": request.user_id,
+        "session_id": request.session_id,
+    }
+
+def sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+OVERLOADED_DETAIL = "Alfred is busy right now, please try again in a moment."
+RETRY_AFTER = {"Retry-After": "5"}
+
+def shed_if_overloaded():
+    # Refuse before saving or running anything when the model queue is already full
+    if ollama_queue.saturated():
+        metrics.incr("chat.shed")
+        raise HTTPException(status_code=503, detail=OVERLOADED_DETAIL, headers=RETRY_AFTER)
+
 @app.post("/chat", response_model=ChatResponse)
 async def chat(request: ChatRequest):
+    shed_if_overloaded()
     try:
         user_id = request.user_id.lower()
         session_id = request.session_id.lower()
 
-        # Non-blocking: send latest prompt to be evaluated for longterm storage
-        #---asyncio.create_task(check_for_longterm_storage(request.content, request.user_id))
+        # Non-blocking: queue the prompt for the background long-term memory classifier
+        memory_classifier.submit(user_id, request.content)
 
-        # Non-blocking: save the user prompt in chat_history
-        asyncio.create_task(save_chat("user", request.content, user_id, session_id))
+        # Queue the user prompt for the background chat_history writer
+        await save_chat("user", request.content, user_id, session_id)
+
+        state = build_state(request)
 
-        state = {
-            "messages": [HumanMessage(content=request.content)],
-            "user_id": request.user_id,
-            "session_id": request.session_id,
-        }
-    
         if DEBUG:
             start = time.perf_counter()
 
         response = await workflow.ainvoke(
             state,
-            config={"recursion_limit": 8}
+            config=GRAPH_CONFIG
         )
 
         # Extract and log response messages in readable format
@@ -91,7 +137,7 @@ async def chat(request: ChatRequest):
             print(f"[DEBUG] Final response: {response_content}")
 
 
-        asyncio.create_task(save_chat("assistant", response_content, user_id, session_id))
+        await save_chat("assistant", response_content, user_id, session_id)
 
         return ChatResponse(
             response=response_content,
@@ -101,6 +147,11 @@ async def chat(request: ChatRequest):
             ]
         )
 
+    except Overloaded:
+        metrics.incr("chat.shed")
+        raise HTTPException(status_code=503, detail=OVERLOADED_DETAIL, headers=RETRY_AFTER)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Alfred took too long to answer, please try again.")
     except Exception as e:
         print(f"Error in chat endpoint: {e}")
         raise HTTPException(
@@ -108,7 +159,123 @@ async def chat(request: ChatRequest):
             detail=f"An error occurred while processing your request: {str(e)}"
         )
 
+@app.post("/chat/stream")
+async def chat_stream(request: ChatRequest):
+    """
+    Same graph run as /chat, streamed as Server-Sent Events:
+        route      - router decision, as soon as router_node finishes
+        tool_start - a tool began running
+        tool_end   - a tool finished
+        token      - a piece of alfred_node's reply
+        done       - the full reply
+        error      - the run failed
+    """
+    shed_if_overloaded()
+    user_id = request.user_id.lower()
+    session_id = request.session_id.lower()
+    memory_classifier.submit(user_id, request.content)
+    await save_chat("user", request.content, user_id, session_id)
+
+    async def event_stream():
+        if DEBUG:
+            start = time.perf_counter()
+        tokens = []
+        final_content = None
+        try:
+            async for event in workflow.astream_events(build_state(request), config=GRAPH_CONFIG, version="v2"):
+                kind = event["event"]
+                node = event.get("metadata", {}).get("langgraph_node")
+
+                if kind == "on_chain_end" and event["name"] == "router_node":
+                    yield sse("route", {"next": event["data"]["output"].get("next")})
+                elif kind == "on_tool_start":
+                    yield sse("tool_start", {"tool": event["name"]})
+                elif kind == "on_tool_end":
+                    yield sse("tool_end", {"tool": event["name"]})
+                elif kind == "on_chat_model_stream" and node == "alfred_node":
+                    token = event["data"]["chunk"].content
+                    if token:
+                        if DEBUG and not tokens:
+                            print(f"[DEBUG] First token after {time.perf_counter() - start:.2f}s")
+                        tokens.append(token)
+                        yield sse("token", {"content": token})
+                elif kind == "on_chain_end" and event["name"] == "alfred_node":
+                    final_content = event["data"]["output"]["messages"][-1]["content"]
+        except Overloaded:
+            metrics.incr("chat.shed")
+            yield sse("error", {"detail": OVERLOADED_DETAIL, "status": 503})
+            return
+        except asyncio.TimeoutError:
+            yield sse("error", {"detail": "Alfred took too long to answer, please try again.", "status": 504})
+            return
+        except Exception as e:
+            print(f"Error in chat stream: {e}")
+            traceback.print_exc()
+            yield sse("error", {"detail": f"An error occurred while processing your request: {str(e)}"})
+            return
+
+        response_content = final_content or "".join(tokens) or "No response was generated"
+        if DEBUG:
+            print(f"[DEBUG] Streamed graph run took {time.perf_counter() - start:.2f}s")
+        await save_chat("assistant", response_content, user_id, session_id)
+        yield sse("done", {"response": response_content})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+HISTORY_PAGE_SIZE = 50
+HISTORY_MAX_PAGE_SIZE = 200
+
 @app.get("/history")
-def get_chat_history(user_id: str = Query("default")):
-    history = load_chat_history(user_id)
-    return history[-10:]
\ No newline at end of file
+async def get_chat_history(
+    request: Request,
+    user_id: str = Query("default"),
+    session_id: str | None = Query(None),
+    before_id: int | None = Query(None, description="page backward: rows older than this id"),
+    since_id: int | None = Query(None, description="sync forward: rows newer than this id"),
+    limit: int = Query(HISTORY_PAGE_SIZE, ge=1, le=HISTORY_MAX_PAGE_SIZE),
+):
+    """
+    Cursor-paginated chat history, oldest first. Without a cursor returns the newest page.
+    Responses carry an ETag built from the newest row id in scope, so a client that
+    already has the data gets a 304 without the page being read.
+    """
+    user_id = user_id.lower()
+    session_id = session_id.lower() if session_id else None
+
+    latest_id = await latest_chat_id(user_id, session_id)
+    etag = f'W/"{latest_id}-{session_id or ""}-{before_id or ""}-{since_id or ""}-{limit}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+
+    messages, has_more = await history_page(user_id, session_id, before_id, since_id, limit)
+    return JSONResponse({
+        "messages": messages,
+        "has_more": has_more,
+        "latest_id": latest_id,
+    }, headers=headers)
+
+@app.get("/reminders")
+async def get_reminders(user_id: str = Query("default")):
+    # Reminders that fired since the last call; fetching them marks them delivered
+    return reminders.pending(user_id)
+
+@app.get("/ready")
+def get_ready():
+    # 503 until every Ollama model has been loaded by the startup warm-up
+    status = models.status()
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
+
+@app.get("/metrics")
+def get_metrics():
+    return {
+        **metrics.snapshot(),
+        "router": router_stats(),
+        "reminders": reminders.stats(),
+        "models": models.status(),
+        "inference": ollama_queue.stats(),
+    }
@@ -0,0 +1,77 @@
+# alfred/backend/utils/cache.py
+
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+class TTLCache:
+    """
+    Thread-safe LRU cache whose entries also expire after ttl seconds.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                return default
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl: float = None):
+        expires = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            entry = self._data.pop(key, _MISSING)
+        return default if entry is _MISSING else entry[1]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __contains__(self, key) -> bool:
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent async calls for the same key: the first caller runs the
+    coroutine and everyone who asks for that key while it is in flight awaits the same result.
+    """
+
+    def __init__(self):
+        self._inflight = {}
+
+    def in_flight(self, key) -> bool:
+        return key in self._inflight
+
+    async def do(self, key, fn):
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(fn())
+            self._inflight[key] = future
+            future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # shield: one cancelled caller must not cancel the call for everyone else
+        return await asyncio.shield(future)
@@ -0,0 +1,169 @@
+# alfred/backend/utils/context.py
+
+# Keeps alfred_node's prompt a roughly constant size however long a session gets.
+# Recent turns are included verbatim newest-first until CONTEXT_HISTORY_TOKENS is used up;
+# older turns are folded into a rolling per-session summary (session_summaries table).
+# The summary is refreshed by a background task that runs alongside the reply, so the
+# Ollama call never sits on the critical path: a turn uses whatever summary already exists.
+# The summary task reads every row past the summary's covered_id from the database, so turns
+# that slid out of the history window, or whose summary call failed or was shed, still get in.
+# Tool outputs in the graph state are cut to CONTEXT_TOOL_TOKENS each.
+
+import asyncio
+import os
+import time
+
+from langchain_core.messages import SystemMessage, ToolMessage
+
+from utils import db, metrics, models
+from utils.cache import TTLCache, SingleFlight
+from utils.inference import ollama_queue, BACKGROUND
+from utils.tools.chat_tools import load_chat_history, history_page
+
+DEBUG = True
+
+HISTORY_TOKENS = int(os.getenv("CONTEXT_HISTORY_TOKENS") or 1500)
+TOOL_OUTPUT_TOKENS = int(os.getenv("CONTEXT_TOOL_TOKENS") or 600)
+SUMMARY_TOKENS = 250
+HISTORY_WINDOW = 30  # rows read per turn for the verbatim part of the prompt
+SUMMARY_BATCH = 60   # most rows folded into the summary by one background call
+
+SUMMARY_SQL = "SELECT summary, covered_id FROM session_summaries WHERE user_id = ? AND session_id = ?"
+UPSERT_SUMMARY_SQL = '''
+    INSERT INTO session_summaries (user_id, session_id, summary, covered_id, updated_ts) VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT (user_id, session_id) DO UPDATE SET
+        summary = excluded.summary, covered_id = excluded.covered_id, updated_ts = excluded.updated_ts
+'''
+
+llm = models.ollama(temperature=0.2)
+
+_summaries = TTLCache(2048, 3600)
+_summarizing = SingleFlight()
+_background = set()  # keeps references to running summary tasks
+
+
+def estimate_tokens(text: str) -> int:
+    # ~4 characters per token is close enough for a budget check
+    return len(text or "") // 4
+
+
+def truncate(text: str, max_tokens: int) -> str:
+    limit = max_tokens * 4
+    if len(text) <= limit:
+        return text
+    return f"{text[:limit]}\n... [{len(text) - limit} more characters truncated]"
+
+
+def condense_tool_outputs(messages: list) -> list:
+    condensed = []
+    for message in messages:
+        if isinstance(message, ToolMessage) and isinstance(message.content, str) \
+                and estimate_tokens(message.content) > TOOL_OUTPUT_TOKENS:
+            metrics.incr("context.tool_truncated")
+            message = message.model_copy(update={"content": truncate(message.content, TOOL_OUTPUT_TOKENS)})
+        condensed.append(message)
+    return condensed
+
+
+async def get_summary(user_id: str, session_id: str) -> tuple:
+    """(summary, covered_id) for the session; ("", 0) if nothing has been summarized yet."""
+    key = (user_id, session_id)
+    cached = _summaries.get(key)
+    if cached is None:
+        row = await db.afetchone(SUMMARY_SQL, key)
+        cached = (row["summary"], row["covered_id"]) if row else ("", 0)
+        _summaries.set(key, cached)
+    return cached
+
+
+async def _summarize(user_id: str, session_id: str, upto_id: int):
+    """Fold the session's rows after covered_id and before upto_id (the first row kept verbatim) into the summary."""
+    if DEBUG:
+        start = time.perf_counter()
+    previous, covered_id = await get_summary(user_id, session_id)
+    rows, has_more = await history_page(user_id, session_id, since_id=covered_id, limit=SUMMARY_BATCH)
+    turns = [row for row in rows if row["id"] < upto_id]
+    # Ids are shared by every session, so unless the page was cut short everything below upto_id is now covered
+    done_id = turns[-1]["id"] if has_more and len(turns) == len(rows) else upto_id - 1
+    if not turns:
+        if done_id > covered_id:
+            await db.aexecute(UPSERT_SUMMARY_SQL, (user_id, session_id, previous, done_id, db.now_ms()))
+            _summaries.set((user_id, session_id), (previous, done_id))
+        return
+    transcript = "\n".join(f"{turn['role']}: {truncate(turn['content'], 200)}" for turn in turns)
+    prompt = f"""
+        Update the running summary of a conversation between a user and their assistant Alfred.
+        Keep facts, names, dates, decisions and open requests. Drop greetings and small talk.
+        Reply with the new summary only, in plain text, under {SUMMARY_TOKENS * 3 // 4} words.
+
+        Current summary:
+        {previous or "(none yet)"}
+
+        New turns to fold in:
+        {transcript}
+        """
+    summary = truncate((await ollama_queue.run(BACKGROUND, llm.ainvoke, prompt)).content.strip(), SUMMARY_TOKENS)
+    covered_id = done_id
+    await db.aexecute(UPSERT_SUMMARY_SQL, (user_id, session_id, summary, covered_id, db.now_ms()))
+    _summaries.set((user_id, session_id), (summary, covered_id))
+    metrics.incr("context.summaries")
+    if DEBUG:
+        duration = time.perf_counter() - start
+        print(f"[DEBUG] summarized {len(turns)} turns for {user_id}/{session_id} in {duration:.2f}s")
+
+
+def _schedule_summary(user_id: str, session_id: str, upto_id: int):
+    key = (user_id, session_id)
+    if _summarizing.in_flight(key):
+        return
+
+    async def run():
+        try:
+            await _summarizing.do(key, lambda: _summarize(user_id, session_id, upto_id))
+        except Exception as e:
+            print(f"Error summarizing session {session_id}: {e}")
+
+    task = asyncio.create_task(run())
+    _background.add(task)
+    task.add_done_callback(_background.discard)
+
+
+async def build_messages(user_id: str, session_id: str, state_messages: list) -> list:
+    """
+    Summary + as much recent history as fits the budget + this turn's messages with tool outputs condensed.
+    """
+    turns = await load_chat_history(user_id, session_id, HISTORY_WINDOW)
+    window_full = len(turns) >= HISTORY_WINDOW
+    summary, covered_id = await get_summary(user_id, session_id)
+
+    # The current prompt is already in the state; don't send it twice if it was saved before we read history
+    current = next((m.content for m in reversed(state_messages) if getattr(m, "type", None) == "human"), None)
+    if turns and turns[-1]["role"] == "user" and turns[-1]["content"] == current:
+        turns.pop()
+
+    recent, used = [], 0
+    unsummarized = [turn for turn in turns if turn["id"] > covered_id]
+    for turn in reversed(unsummarized):
+        cost = estimate_tokens(turn["content"])
+        if used + cost > HISTORY_TOKENS:
+            break
+        recent.append(turn)
+        used += cost
+    recent.reverse()
+
+    overflow = unsummarized[:len(unsummarized) - len(recent)]
+    # A full window whose oldest row is past covered_id may have unsummarized rows before it
+    behind = window_full and bool(turns) and turns[0]["id"] > covered_id
+    if overflow or behind:
+        _schedule_summary(user_id, session_id, recent[0]["id"] if recent else turns[-1]["id"] + 1)
+
+    messages = []
+    if summary:
+        messages.append(SystemMessage(content=f"Summary of the earlier conversation:\n{summary}"))
+    messages += [{"role": turn["role"], "content": turn["content"]} for turn in recent]
+    messages += condense_tool_outputs(state_messages)
+
+    if DEBUG:
+        print(f"[DEBUG] context: summary {estimate_tokens(summary)} tokens, {len(recent)} turns ({used} tokens), "
+              f"{len(overflow)} turns queued for summary{' (plus older rows)' if behind else ''}")
+    return messages
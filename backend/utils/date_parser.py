@@ -0,0 +1,174 @@
+# alfred/backend/utils/date_parser.py
+
+# Natural-language date parsing for tasks.
+# The phrases the task node actually sends ("tomorrow", "next wednesday", "june 20th at 8:00",
+# ISO dates) are handled by precompiled regexes; anything else goes to one shared
+# parsedatetime.Calendar. Results are memoized per (phrase, current day), and are in
+# ALFRED_TIMEZONE when it is set (timezone-aware datetimes), otherwise naive local time.
+# Phrases without a time default to 09:00, like parsedatetime does for "today" / "tomorrow".
+# An explicit time that doesn't exist ("tomorrow at 25") raises rather than falling back to 09:00.
+
+import os
+import re
+import threading
+from datetime import datetime, timedelta
+
+import parsedatetime
+
+from utils import metrics
+from utils.cache import TTLCache
+
+DEFAULT_HOUR = 9
+TONIGHT_HOUR = 21
+CACHE_SIZE = 2048
+CACHE_TTL = 24 * 3600
+
+TIMEZONE = None
+if os.getenv("ALFRED_TIMEZONE"):
+    from zoneinfo import ZoneInfo
+    TIMEZONE = ZoneInfo(os.getenv("ALFRED_TIMEZONE"))
+
+WEEKDAYS = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+MONTHS = ["january", "february", "march", "april", "may", "june", "july",
+          "august", "september", "october", "november", "december"]
+NUMBERS = {"a": 1, "an": 1, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5,
+           "six": 6, "seven": 7, "eight": 8, "nine": 9, "ten": 10}
+
+# Real names and abbreviations only, so "junk 5" or "market 3" never read as a date
+_WEEKDAY = (r"(mon(?:day)?|tue(?:s(?:day)?)?|wed(?:nesday)?|thu(?:r(?:s(?:day)?)?)?|fri(?:day)?"
+            r"|sat(?:urday)?|sun(?:day)?)")
+_MONTH = (r"(jan(?:uary)?|feb(?:ruary)?|mar(?:ch)?|apr(?:il)?|may|june?|july?|aug(?:ust)?"
+          r"|sep(?:t(?:ember)?)?|oct(?:ober)?|nov(?:ember)?|dec(?:ember)?)\.?")
+_TIME = r"(?:\s+(?:at\s+)?(?P<time>noon|midnight|\d{1,2}(?::\d{2})?\s*(?:am|pm|a\.m\.|p\.m\.)?))?"
+
+ISO_RE = re.compile(r"^(\d{4}-\d{2}-\d{2})(?:[ t](\d{1,2}:\d{2}(?::\d{2})?))?$")
+RELATIVE_DAY_RE = re.compile(r"^(today|tonight|tomorrow|tmrw|tmr)" + _TIME + r"$")
+WEEKDAY_RE = re.compile(r"^(?:(?:next|this|on)\s+)?" + _WEEKDAY + _TIME + r"$")
+MONTH_DAY_RE = re.compile(r"^" + _MONTH + r"\s+(\d{1,2})(?:st|nd|rd|th)?(?:,?\s+(\d{4}))?" + _TIME + r"$")
+IN_DAYS_RE = re.compile(r"^in\s+(\d+|" + "|".join(NUMBERS) + r")\s+(day|week)s?" + _TIME + r"$")
+TIME_RE = re.compile(r"^(\d{1,2})(?::(\d{2}))?\s*(am|pm|a\.m\.|p\.m\.)?$")
+
+_calendar = parsedatetime.Calendar()
+_calendar_lock = threading.Lock()  # parsedatetime keeps per-parse state on the Calendar
+_cache = TTLCache(CACHE_SIZE, CACHE_TTL)
+
+
+class InvalidTime(ValueError):
+    """The phrase names a time of day that doesn't exist ("tomorrow at 25")."""
+
+
+def now() -> datetime:
+    return datetime.now(TIMEZONE)
+
+
+def _time_of_day(text: str | None, default_hour: int, evening: bool = False) -> tuple:
+    if not text:
+        return default_hour, 0
+    if text == "noon":
+        return 12, 0
+    if text == "midnight":
+        return 0, 0
+    match = TIME_RE.match(text)
+    hour, minute = int(match.group(1)), int(match.group(2) or 0)
+    meridiem = (match.group(3) or "").replace(".", "")
+    if meridiem and not 1 <= hour <= 12:
+        raise InvalidTime(f"Invalid time: {text}")
+    if (meridiem == "pm" or (evening and not meridiem)) and hour < 12:
+        hour += 12
+    elif meridiem == "am" and hour == 12:
+        hour = 0
+    if hour > 23 or minute > 59:
+        raise InvalidTime(f"Invalid time: {text}")
+    return hour, minute
+
+
+def _at(day: datetime, time_text: str | None, default_hour: int = DEFAULT_HOUR, evening: bool = False) -> datetime:
+    hour, minute = _time_of_day(time_text, default_hour, evening)
+    return day.replace(hour=hour, minute=minute, second=0, microsecond=0)
+
+
+def _fast_parse(text: str, current: datetime) -> datetime | None:
+    match = ISO_RE.match(text)
+    if match:
+        value = datetime.fromisoformat(match.group(1) + (" " + match.group(2) if match.group(2) else ""))
+        if not match.group(2):
+            value = value.replace(hour=DEFAULT_HOUR)
+        return value.replace(tzinfo=current.tzinfo)
+
+    match = RELATIVE_DAY_RE.match(text)
+    if match:
+        word = match.group(1)
+        day = current + timedelta(days=0 if word in ("today", "tonight") else 1)
+        if word == "tonight":
+            # "tonight at 8" is 20:00, not 08:00
+            return _at(day, match.group("time"), TONIGHT_HOUR, evening=True)
+        return _at(day, match.group("time"))
+
+    match = WEEKDAY_RE.match(text)
+    if match:
+        target = next(i for i, name in enumerate(WEEKDAYS) if name.startswith(match.group(1)))
+        # The coming one: always 1-7 days ahead, so "sunday" on a Sunday means next week
+        ahead = (target - current.weekday() - 1) % 7 + 1
+        return _at(current + timedelta(days=ahead), match.group("time"))
+
+    match = MONTH_DAY_RE.match(text)
+    if match:
+        month = next(i for i, name in enumerate(MONTHS, 1) if name.startswith(match.group(1)))
+        day, year = int(match.group(2)), match.group(3)
+        value = _at(current.replace(year=int(year) if year else current.year, month=month, day=day), match.group("time"))
+        if not year and value.date() < current.date():
+            value = value.replace(year=current.year + 1)
+        return value
+
+    match = IN_DAYS_RE.match(text)
+    if match:
+        count = match.group(1)
+        count = int(count) if count.isdigit() else NUMBERS[count]
+        days = count * (7 if match.group(2) == "week" else 1)
+        return _at(current + timedelta(days=days), match.group("time"))
+
+    return None
+
+
+def _calendar_parse(text: str, current: datetime) -> datetime | None:
+    with _calendar_lock:
+        time_struct, status = _calendar.parse(text, sourceTime=current.timetuple())
+    if status == 0:
+        return None
+    return datetime(*time_struct[:6], tzinfo=current.tzinfo)
+
+
+def parse(text: str) -> datetime:
+    """
+    Parse a natural-language date relative to now. Raises ValueError when it can't.
+    """
+    key = " ".join((text or "").lower().split()).rstrip(".")
+    if not key:
+        raise ValueError("Could not parse date")
+    current = now()
+    cache_key = (key, current.date())
+    value = _cache.get(cache_key)
+    if value is not None:
+        metrics.incr("parse_date.cached")
+        return value
+
+    try:
+        value = _fast_parse(key, current)
+    except InvalidTime:
+        # parsedatetime would drop the bad time and quietly use 09:00
+        raise
+    except ValueError:
+        value = None  # e.g. "february 30th": let parsedatetime have a go
+    if value is not None:
+        metrics.incr("parse_date.fast")
+        _cache.set(cache_key, value)
+        return value
+
+    metrics.incr("parse_date.calendar")
+    value = _calendar_parse(key, current)
+    if value is None:
+        raise ValueError("Could not parse date")
+    # Only memoize answers that don't move with the clock ("in 3 hours" does, "next month" doesn't)
+    if _calendar_parse(key, current + timedelta(minutes=1)) == value:
+        _cache.set(cache_key, value)
+    return value
@@ -2,52 +2,193 @@
 
 import sqlite3
 import os
+import asyncio
+import threading
+import time
+from datetime import datetime
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
 
-def get_db_connection():
-    db_path = os.path.join(os.path.dirname(__file__), "..", "alfred_memory.db")
-    conn = sqlite3.connect(os.path.abspath(db_path))
-    conn.row_factory = sqlite3.Row
-    return conn
+DB_PATH = os.path.abspath(
+    os.getenv("ALFRED_DB_PATH") or os.path.join(os.path.dirname(__file__), "..", "alfred_memory.db")
+)
+POOL_SIZE = int(os.getenv("DB_POOL_SIZE") or 4)
+STATEMENT_CACHE_SIZE = 256
 
-def init_db():
-    conn = get_db_connection()
-    cursor = conn.cursor()
-
-    # Table for long-term memory
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS longterm_memory (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            timestamp TEXT NOT NULL,
-            user_id TEXT NOT NULL,
-            content TEXT NOT NULL,
-            summary TEXT,
-            tags TEXT
-        )
-    ''')
-    # Table for chat history
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS chat_history (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            timestamp TEXT NOT NULL,
-            role TEXT NOT NULL,
-            content TEXT NOT NULL,
-            user_id TEXT NOT NULL,
-            session_id TEXT NOT NULL
-        )
-    ''')
-    # Table for tasks
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS tasks (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            timestamp TEXT NOT NULL,            
-            user_id TEXT NOT NULL,              
-            category TEXT NOT NULL,             
-            task TEXT NOT NULL,                 
-            due_date TEXT,                      
-            recurrence TEXT,                    
-            completed INTEGER DEFAULT 0,        
-            notes TEXT                      
+PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA busy_timeout = 5000",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA cache_size = -16000",
+    "PRAGMA mmap_size = 134217728",
+    "PRAGMA foreign_keys = ON",
+)
+
+
+class ConnectionPool:
+    """
+    Bounded pool of SQLite connections, at most `size` of them ever open.
+    A thread checks a connection out for the length of a connection() block and prefers
+    the one it used last, so each executor worker keeps reusing the same sqlite3 statement
+    cache. Nested connection() blocks on one thread share the outer connection. Every
+    connection opened is registered, so close() can optimize and close all of them.
+    """
+
+    def __init__(self, path: str, size: int):
+        self.path = path
+        self.size = size
+        self._local = threading.local()
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._connections = []  # every connection opened, idle or checked out
+        self._idle = []
+        self._executor = None
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self.path,
+            timeout=5.0,
+            isolation_level=None,  # autocommit; multi-statement writes go through transaction()
+            cached_statements=STATEMENT_CACHE_SIZE,
+            check_same_thread=False,  # only one thread holds it at a time; close() runs on the main thread
         )
-    ''')
-    conn.commit()
-    conn.close()
+        conn.row_factory = sqlite3.Row
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def _checkout(self) -> sqlite3.Connection:
+        last = getattr(self._local, "last", None)
+        with self._lock:
+            if last is not None and last in self._idle:
+                self._idle.remove(last)
+                return last
+            if self._idle:
+                return self._idle.pop()
+            # Holding a slot with nothing idle means fewer than `size` connections exist
+            conn = self._connect()
+            self._connections.append(conn)
+            return conn
+
+    @contextmanager
+    def connection(self):
+        held = getattr(self._local, "conn", None)
+        if held is not None:
+            yield held
+            return
+        with self._slots:
+            conn = self._local.conn = self._checkout()
+            try:
+                yield conn
+            finally:
+                self._local.conn = None
+                self._local.last = conn
+                with self._lock:
+                    if conn in self._connections:
+                        self._idle.append(conn)
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        # Async callers share a fixed set of worker threads, one per pooled connection
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.size, thread_name_prefix="alfred-db")
+        return self._executor
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        with self._lock:
+            for conn in self._connections:
+                try:
+                    conn.execute("PRAGMA optimize")
+                except sqlite3.Error as e:
+                    print(f"[ERROR] PRAGMA optimize failed on close: {e}")
+                conn.close()
+            self._connections.clear()
+            self._idle.clear()
+        self._local = threading.local()
+
+
+pool = ConnectionPool(DB_PATH, POOL_SIZE)
+
+
+@contextmanager
+def transaction():
+    with pool.connection() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+
+def execute(sql: str, params=()) -> int:
+    with pool.connection() as conn:
+        return conn.execute(sql, params).lastrowid
+
+
+def executemany(sql: str, rows) -> None:
+    with transaction() as conn:
+        conn.executemany(sql, rows)
+
+
+def fetchall(sql: str, params=()) -> list:
+    with pool.connection() as conn:
+        return conn.execute(sql, params).fetchall()
+
+
+def fetchone(sql: str, params=()):
+    with pool.connection() as conn:
+        return conn.execute(sql, params).fetchone()
+
+
+async def run(fn, *args):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(pool.executor, fn, *args)
+
+
+async def aexecute(sql: str, params=()) -> int:
+    return await run(execute, sql, params)
+
+
+async def aexecutemany(sql: str, rows) -> None:
+    return await run(executemany, sql, rows)
+
+
+async def afetchall(sql: str, params=()) -> list:
+    return await run(fetchall, sql, params)
+
+
+async def afetchone(sql: str, params=()):
+    return await run(fetchone, sql, params)
+
+
+def close_db():
+    pool.close()
+
+
+def now_ms() -> int:
+    return int(time.time() * 1000)
+
+
+def to_ms(value) -> int | None:
+    """Convert an ISO timestamp (or datetime) to sortable epoch milliseconds."""
+    if value is None or value == "":
+        return None
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return int(value.timestamp() * 1000)
+
+
+def init_db():
+    from utils.migrations import migrate
+
+    with pool.connection() as conn:
+        version = migrate(conn)
+    print(f"DATABASE SCHEMA VERSION: {version}")
@@ -0,0 +1,89 @@
+# alfred/backend/utils/embeddings.py
+
+# Text embeddings for semantic memory recall.
+# If OLLAMA_EMBED_MODEL is set (e.g. nomic-embed-text) vectors come from Ollama; otherwise,
+# or whenever Ollama is unreachable, a local hashed bag-of-words/char-trigram embedding is used.
+# Every vector is float32 and L2-normalized, so cosine similarity is a plain dot product.
+# The model name is stored next to each vector so vectors from different models never get compared.
+# Ollama embedding calls go through ollama_queue like every other Ollama call; callers pick the class.
+
+import os
+import re
+import zlib
+
+import numpy as np
+
+from utils import metrics, models
+from utils.inference import ollama_queue, TOOL
+
+DEBUG = True
+
+EMBED_MODEL = os.getenv("OLLAMA_EMBED_MODEL") or None
+HASH_DIM = 512
+HASH_MODEL = f"hash-{HASH_DIM}"
+
+_WORD_RE = re.compile(r"\w+")
+
+# Registered at import so the model is loaded by models.warm_up() along with the chat models
+_ollama = models.ollama_embeddings(EMBED_MODEL) if EMBED_MODEL else None
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return np.ascontiguousarray(matrix / norms, dtype=np.float32)
+
+
+def _features(text: str) -> list:
+    # Whole words plus character trigrams, so "cats" still lands near "cat"
+    words = _WORD_RE.findall(text.lower())
+    features = list(words)
+    for word in words:
+        padded = f"#{word}#"
+        features.extend(padded[i:i + 3] for i in range(len(padded) - 2))
+    return features
+
+
+def hash_embed(texts: list) -> np.ndarray:
+    matrix = np.zeros((len(texts), HASH_DIM), dtype=np.float32)
+    for row, text in enumerate(texts):
+        for feature in _features(text):
+            h = zlib.crc32(feature.encode())
+            # the top bit picks the sign so collisions tend to cancel out instead of piling up
+            matrix[row, h % HASH_DIM] += 1.0 if h & 0x80000000 else -1.0
+    return _normalize(matrix)
+
+
+def active_model() -> str:
+    return EMBED_MODEL or HASH_MODEL
+
+
+async def embed(texts: list, cls: str = TOOL) -> tuple:
+    """
+    Embed texts and return (model_name, float32 matrix with one normalized row per text).
+    cls is the ollama_queue class the Ollama call waits in.
+    """
+    if not texts:
+        return active_model(), np.zeros((0, HASH_DIM), dtype=np.float32)
+    if EMBED_MODEL:
+        try:
+            vectors = await ollama_queue.run(cls, _ollama.aembed_documents, texts)
+            metrics.incr("embeddings.ollama", len(texts))
+            return EMBED_MODEL, _normalize(np.asarray(vectors, dtype=np.float32))
+        except Exception as e:
+            print(f"Ollama embeddings unavailable, using hashed embeddings: {e}")
+    metrics.incr("embeddings.hash", len(texts))
+    return HASH_MODEL, hash_embed(texts)
+
+
+async def embed_one(text: str, cls: str = TOOL) -> tuple:
+    model, matrix = await embed([text], cls)
+    return model, matrix[0]
+
+
+def to_blob(vector: np.ndarray) -> bytes:
+    return np.asarray(vector, dtype=np.float32).tobytes()
+
+
+def from_blob(blob: bytes) -> np.ndarray:
+    return np.frombuffer(blob, dtype=np.float32)
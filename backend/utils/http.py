@@ -0,0 +1,25 @@
+# alfred/backend/utils/http.py
+
+# One pooled httpx.AsyncClient shared by every tool that calls an external API.
+# Created lazily on first use and closed by the FastAPI lifespan in main.py.
+
+import httpx
+
+TIMEOUT = httpx.Timeout(10.0, connect=5.0)
+LIMITS = httpx.Limits(max_connections=50, max_keepalive_connections=10, keepalive_expiry=60)
+
+_client = None
+
+
+def get_client() -> httpx.AsyncClient:
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(timeout=TIMEOUT, limits=LIMITS)
+    return _client
+
+
+async def close_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
@@ -0,0 +1,123 @@
+# alfred/backend/utils/inference.py
+
+# Admission control for the local Ollama server.
+# Ollama only runs a few generations at once and queues the rest first come, first served, so a
+# quick router call could sit behind a long memory or weather generation. Every Ollama call
+# (generations and embeddings; only the startup warm-up skips it) goes through
+# ollama_queue.run(cls, ...) instead: at most OLLAMA_CONCURRENCY calls run at a time,
+# and when a slot frees up it goes to the waiting call with the best priority:
+#     router > interactive (memory/weather nodes) > tool (LLM calls made by tools) > background
+# Each class may only have so many calls waiting. Past that the call fails straight away with
+# Overloaded, which /chat turns into a 503, instead of piling up. Each class also has a time
+# limit that covers both the wait and the call. Wait and run times are in /metrics.
+
+import asyncio
+import heapq
+import itertools
+import os
+import time
+
+from utils import metrics
+
+DEBUG = True
+
+ROUTER = "router"
+INTERACTIVE = "interactive"
+TOOL = "tool"
+BACKGROUND = "background"
+
+CONCURRENCY = int(os.getenv("OLLAMA_CONCURRENCY") or 2)
+MAX_WAITING = int(os.getenv("OLLAMA_MAX_WAITING") or 32)
+
+# class -> (priority, most calls allowed to wait, seconds allowed for wait + call)
+CLASSES = {
+    ROUTER: (0, MAX_WAITING, 20.0),
+    INTERACTIVE: (1, MAX_WAITING, 90.0),
+    TOOL: (2, MAX_WAITING, 60.0),
+    BACKGROUND: (3, max(1, MAX_WAITING // 4), 300.0),
+}
+
+
+class Overloaded(Exception):
+    """Too many Ollama calls are already waiting; the caller should back off."""
+
+
+class InferenceScheduler:
+    def __init__(self, concurrency: int = CONCURRENCY):
+        self.concurrency = concurrency
+        self._running = 0
+        self._waiters = []  # heap of (priority, seq, cls, future)
+        self._waiting = {cls: 0 for cls in CLASSES}
+        self._seq = itertools.count()
+
+    def saturated(self, cls: str = INTERACTIVE) -> bool:
+        """True when a new call of this class would be shed. Lets endpoints refuse work before starting it."""
+        return self._running >= self.concurrency and self._waiting[cls] >= CLASSES[cls][1]
+
+    async def _acquire(self, cls: str):
+        if self._running < self.concurrency and not self._waiters:
+            self._running += 1
+            return
+        priority, max_waiting, _ = CLASSES[cls]
+        if self._waiting[cls] >= max_waiting:
+            metrics.incr(f"inference.shed.{cls}")
+            raise Overloaded(f"Too many {cls} model calls waiting")
+
+        future = asyncio.get_running_loop().create_future()
+        entry = (priority, next(self._seq), cls, future)
+        heapq.heappush(self._waiters, entry)
+        self._waiting[cls] += 1
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # The slot was handed to us just as we gave up; pass it on
+                self._release()
+            elif entry in self._waiters:
+                # (_release may already have popped it, and counted it, while skipping cancelled waiters)
+                self._waiters.remove(entry)
+                heapq.heapify(self._waiters)
+                self._waiting[cls] -= 1
+            raise
+
+    def _release(self):
+        # Hand the slot straight to the best waiter so nothing can jump the queue in between
+        while self._waiters:
+            _, _, cls, future = heapq.heappop(self._waiters)
+            self._waiting[cls] -= 1
+            if not future.done():
+                future.set_result(None)
+                return
+        self._running -= 1
+
+    async def run(self, cls: str, fn, *args, **kwargs):
+        """await fn(*args, **kwargs) once a slot is free. Raises Overloaded or asyncio.TimeoutError."""
+        timeout = CLASSES[cls][2]
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(self._acquire(cls), timeout)
+        except asyncio.TimeoutError:
+            metrics.incr(f"inference.timeout.{cls}")
+            raise
+        waited = time.perf_counter() - start
+        metrics.observe(f"inference.wait.{cls}", waited)
+        try:
+            return await asyncio.wait_for(fn(*args, **kwargs), max(0.1, timeout - waited))
+        except asyncio.TimeoutError:
+            metrics.incr(f"inference.timeout.{cls}")
+            raise
+        finally:
+            self._release()
+            metrics.observe(f"inference.run.{cls}", time.perf_counter() - start - waited)
+            if DEBUG and waited > 1:
+                print(f"[DEBUG] {cls} model call waited {waited:.2f}s for a slot")
+
+    def stats(self) -> dict:
+        return {
+            "concurrency": self.concurrency,
+            "running": self._running,
+            "waiting": dict(self._waiting),
+        }
+
+
+ollama_queue = InferenceScheduler()
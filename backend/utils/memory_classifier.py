@@ -0,0 +1,236 @@
+# alfred/backend/utils/memory_classifier.py
+
+# Decides in the background which user messages are worth keeping in long-term memory.
+# /chat and /chat/stream only submit() the prompt; a worker collects pending messages for up
+# to BATCH_WINDOW seconds (or BATCH_SIZE messages) and classifies the whole batch with one
+# JSON-mode Ollama call. The instructions and few-shot examples are rendered once into
+# PROMPT_PREFIX and every batch prompt starts with it, so Ollama can reuse the cached prefix
+# and only evaluate the new messages. Accepted memories are embedded and inserted together.
+# If the queue is full, messages are dropped rather than slowing down a reply.
+
+import asyncio
+import json
+import re
+import time
+
+from utils import metrics, models
+from utils.inference import ollama_queue, BACKGROUND
+from utils.tools.memory_tools import insert_memories
+
+DEBUG = True
+
+BATCH_SIZE = 8
+BATCH_WINDOW = 2.0      # seconds to wait for more messages after the first one
+MAX_PENDING = 500
+MIN_WORDS = 3           # "thanks", "ok cool" and the like are never memories
+MAX_MESSAGE_CHARS = 500
+STOP_TIMEOUT = 10.0     # seconds shutdown waits for the last batch
+
+EXAMPLES = [
+    ("My cat's name is Memphis and he takes his medication every night at 7pm.",
+     {"save": True, "summary": "User's cat Memphis takes medication at 7pm", "tags": ["cat", "medication", "schedule"]}),
+    ("This should be saved to longterm memory, my house was built in 2017.",
+     {"save": True, "summary": "User's house was built in 2017", "tags": ["house", "built"]}),
+    ("Can you remember when I was a kid I had a dog named Jocko?",
+     {"save": True, "summary": "User once had a dog named Jocko", "tags": ["dog", "past-pet", "childhood"]}),
+    ("What's the weather like today?",
+     {"save": False, "summary": "", "tags": []}),
+    ("My birthday is September 10th.",
+     {"save": True, "summary": "User's birthday is September 10th", "tags": ["birthday", "personal_info"]}),
+    ("Turn off the lights in the living room.",
+     {"save": False, "summary": "", "tags": []}),
+    ("Add a task to clean the bathroom every Friday",
+     {"save": False, "summary": "", "tags": []}),
+]
+
+
+def _render_prefix() -> str:
+    example_messages = "\n".join(f'{i}. "{message}"' for i, (message, _) in enumerate(EXAMPLES, 1))
+    example_results = json.dumps({"results": [{"id": i, **result} for i, (_, result) in enumerate(EXAMPLES, 1)]})
+    return f"""You are a memory classification assistant. For each numbered message decide whether it
+contains a lasting fact about the user (people, pets, dates, preferences, possessions, history)
+that should be stored in long-term memory. Questions, commands, small talk and task requests
+are not memories; tasks are stored separately.
+Reply with JSON only: {{"results": [{{"id": <message number>, "save": true/false, "summary": "...", "tags": []}}]}}
+with exactly one result per message.
+
+Messages:
+{example_messages}
+Response: {example_results}
+
+Messages:
+"""
+
+
+PROMPT_PREFIX = _render_prefix()
+
+llm = models.ollama(temperature=0, format="json")
+
+_JSON_RE = re.compile(r"[\[{].*[\]}]", re.DOTALL)
+_OBJECT_RE = re.compile(r"\{[^{}]*\}")
+
+
+def build_prompt(messages: list) -> str:
+    numbered = "\n".join(f'{i}. {json.dumps(text[:MAX_MESSAGE_CHARS])}' for i, text in enumerate(messages, 1))
+    return f"{PROMPT_PREFIX}{numbered}\nResponse:"
+
+
+def _loads(text: str):
+    try:
+        return json.loads(text)
+    except ValueError:
+        pass
+    match = _JSON_RE.search(text)
+    if match:
+        try:
+            return json.loads(match.group(0))
+        except ValueError:
+            pass
+    # Last resort: whichever flat result objects are intact
+    items = []
+    for fragment in _OBJECT_RE.findall(text):
+        try:
+            items.append(json.loads(fragment))
+        except ValueError:
+            continue
+    return items
+
+
+def _as_bool(value) -> bool:
+    if isinstance(value, str):
+        return value.strip().lower() in ("true", "yes", "1")
+    return bool(value)
+
+
+def _as_tags(value) -> list:
+    if isinstance(value, str):
+        value = value.split(",")
+    if not isinstance(value, list):
+        return []
+    return [str(tag).strip() for tag in value if str(tag).strip()]
+
+
+def parse_results(text: str, count: int) -> dict:
+    """
+    {message number: {"save", "summary", "tags"}} from a model reply. Tolerates code fences,
+    chatter around the JSON, a bare list, a single object and string booleans; results for
+    numbers outside 1..count are ignored.
+    """
+    parsed = _loads(text.replace("```json", "").replace("```", "").strip())
+    if isinstance(parsed, dict):
+        parsed = parsed.get("results", [parsed] if "save" in parsed else [])
+    if not isinstance(parsed, list):
+        return {}
+
+    results = {}
+    for position, item in enumerate(parsed, 1):
+        if not isinstance(item, dict):
+            continue
+        try:
+            number = int(item.get("id", position))
+        except (TypeError, ValueError):
+            number = position
+        if not 1 <= number <= count or number in results:
+            continue
+        results[number] = {
+            "save": _as_bool(item.get("save")),
+            "summary": str(item.get("summary") or "").strip(),
+            "tags": _as_tags(item.get("tags")),
+        }
+    return results
+
+
+class MemoryClassifier:
+    def __init__(self, batch_size: int = BATCH_SIZE, batch_window: float = BATCH_WINDOW, max_pending: int = MAX_PENDING):
+        self.batch_size = batch_size
+        self.batch_window = batch_window
+        self.max_pending = max_pending
+        self._queue = None
+        self._task = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def start(self):
+        if self.running:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_pending)
+        self._task = asyncio.create_task(self._run(), name="memory-classifier")
+
+    async def stop(self):
+        if not self.running:
+            return
+        try:
+            self._queue.put_nowait(None)
+            await asyncio.wait_for(asyncio.shield(self._task), STOP_TIMEOUT)
+        except (asyncio.QueueFull, asyncio.TimeoutError):
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+
+    def submit(self, user_id: str, content: str):
+        """Queue a user message for classification. Never waits."""
+        content = (content or "").strip()
+        if not self.running or len(content.split()) < MIN_WORDS:
+            metrics.incr("memory_classifier.skipped")
+            return
+        try:
+            self._queue.put_nowait((user_id, content))
+            metrics.incr("memory_classifier.queued")
+        except asyncio.QueueFull:
+            metrics.incr("memory_classifier.dropped")
+
+    async def _run(self):
+        stopping = False
+        while not stopping:
+            item = await self._queue.get()
+            if item is None:
+                break
+            batch = [item]
+            deadline = time.monotonic() + self.batch_window
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                try:
+                    item = self._queue.get_nowait() if timeout <= 0 else await asyncio.wait_for(self._queue.get(), timeout)
+                except (asyncio.TimeoutError, asyncio.QueueEmpty):
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            try:
+                await self._classify(batch)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                metrics.incr("memory_classifier.errors")
+                print(f"Error in long-term memory classification: {e}")
+
+    async def _classify(self, batch: list):
+        start = time.perf_counter()
+        batch = list(dict.fromkeys(batch))  # the same message sent twice only needs one verdict
+        reply = await ollama_queue.run(BACKGROUND, llm.ainvoke, build_prompt([content for _, content in batch]))
+        results = parse_results(reply.content, len(batch))
+        if len(results) < len(batch):
+            metrics.incr("memory_classifier.unparsed", len(batch) - len(results))
+
+        accepted = []
+        for number, (user_id, content) in enumerate(batch, 1):
+            result = results.get(number)
+            if result and result["save"]:
+                accepted.append((user_id, content, result["summary"] or content, result["tags"]))
+        await insert_memories(accepted, BACKGROUND)
+
+        duration = time.perf_counter() - start
+        metrics.incr("memory_classifier.batches")
+        metrics.incr("memory_classifier.saved", len(accepted))
+        metrics.observe("memory_classifier.batch", duration)
+        if DEBUG:
+            print(f"[DEBUG] classified {len(batch)} messages, saved {len(accepted)} memories in {duration:.2f}s")
+
+
+memory_classifier = MemoryClassifier()
@@ -0,0 +1,164 @@
+# alfred/backend/utils/memory_dedup.py
+
+# Keeps repeated facts ("my cat is Memphis", three times) from piling up in longterm_memory.
+# Every memory stores its MinHash signature (utils/minhash.py) and one memory_lsh row per band.
+# Before a memory is inserted, its bucket keys are looked up for that user; candidates whose
+# word sets are at least DUPLICATE_SIMILARITY alike are merged instead: the newer wording wins,
+# tags are unioned and the row's timestamp is refreshed. The lookup reads a handful of index
+# entries however many memories the user has.
+#
+# Memories saved before the check existed can be merged in bulk:
+#   python -m utils.memory_dedup [--user USER_ID] [--dry-run]
+
+import argparse
+import json
+
+from utils import db, metrics, minhash, vector_index
+
+DEBUG = True
+
+DUPLICATE_SIMILARITY = 0.7
+
+CANDIDATES_SQL = '''
+    SELECT DISTINCT m.id, m.content, m.summary, m.tags
+    FROM memory_lsh b
+    JOIN longterm_memory m ON m.id = b.memory_id
+    WHERE b.user_id = ? AND b.bucket IN ({placeholders})
+'''
+
+DELETE_BUCKETS_SQL = "DELETE FROM memory_lsh WHERE memory_id = ?"
+INSERT_BUCKET_SQL = "INSERT OR IGNORE INTO memory_lsh (user_id, bucket, memory_id) VALUES (?, ?, ?)"
+SAVE_SIGNATURE_SQL = "UPDATE longterm_memory SET minhash = ? WHERE id = ?"
+
+UNSIGNED_MEMORIES_SQL = "SELECT id, user_id, content, summary FROM longterm_memory WHERE minhash IS NULL"
+
+# Memories sharing at least one bucket with another memory of the same user
+BUCKET_PAIRS_SQL = '''
+    SELECT DISTINCT a.memory_id AS a_id, b.memory_id AS b_id
+    FROM memory_lsh a
+    JOIN memory_lsh b ON b.user_id = a.user_id AND b.bucket = a.bucket AND b.memory_id > a.memory_id
+    {where}
+'''
+
+MEMORIES_SQL = "SELECT id, user_id, ts, content, summary, tags FROM longterm_memory {where}"
+MERGE_TAGS_SQL = "UPDATE longterm_memory SET tags = ?, embedding = NULL WHERE id = ?"
+DELETE_MEMORY_SQL = "DELETE FROM longterm_memory WHERE id = ?"
+
+
+def merge_tags(*tag_lists) -> list:
+    merged = {}
+    for tags in tag_lists:
+        if isinstance(tags, str):
+            tags = json.loads(tags or "[]")
+        for tag in tags or []:
+            merged.setdefault(str(tag).lower(), tag)
+    return list(merged.values())
+
+
+def index_memory(conn, user_id: str, memory_id: int, sig) -> None:
+    """Store a memory's signature and (re)write its buckets. Runs inside the caller's transaction."""
+    conn.execute(SAVE_SIGNATURE_SQL, (minhash.to_blob(sig), memory_id))
+    conn.execute(DELETE_BUCKETS_SQL, (memory_id,))
+    conn.executemany(INSERT_BUCKET_SQL, [(user_id, key, memory_id) for key in minhash.bucket_keys(sig)])
+
+
+def sign_unsigned(conn) -> int:
+    """Sign every memory that has no signature yet (rows older than the check). Returns how many."""
+    rows = conn.execute(UNSIGNED_MEMORIES_SQL).fetchall()
+    for memory_id, user_id, content, summary in rows:
+        index_memory(conn, user_id, memory_id, minhash.signature(minhash.tokens(content, summary)))
+    return len(rows)
+
+
+async def find_duplicate(user_id: str, words: frozenset, sig):
+    """The existing memory most like `words`, if any is at least DUPLICATE_SIMILARITY alike."""
+    keys = minhash.bucket_keys(sig)
+    sql = CANDIDATES_SQL.format(placeholders=", ".join("?" * len(keys)))
+    best, best_score = None, DUPLICATE_SIMILARITY
+    for row in await db.afetchall(sql, (user_id, *keys)):
+        score = minhash.jaccard(words, minhash.tokens(row["content"], row["summary"]))
+        if score >= best_score:
+            best, best_score = row, score
+    return best
+
+
+def _find_groups(user_id: str | None) -> list:
+    """Lists of memory rows that are near-duplicates of each other, oldest first."""
+    where, params = ("WHERE a.user_id = ?", (user_id,)) if user_id else ("", ())
+    pairs = db.fetchall(BUCKET_PAIRS_SQL.format(where=where), params)
+    if not pairs:
+        return []
+
+    where, params = ("WHERE user_id = ?", (user_id,)) if user_id else ("", ())
+    rows = {row["id"]: row for row in db.fetchall(MEMORIES_SQL.format(where=where), params)}
+    words = {}
+
+    def words_of(memory_id):
+        if memory_id not in words:
+            row = rows[memory_id]
+            words[memory_id] = minhash.tokens(row["content"], row["summary"])
+        return words[memory_id]
+
+    parent = {}
+
+    def root(memory_id):
+        while parent.get(memory_id, memory_id) != memory_id:
+            memory_id = parent[memory_id]
+        return memory_id
+
+    for pair in pairs:
+        a, b = pair["a_id"], pair["b_id"]
+        if a in rows and b in rows and minhash.jaccard(words_of(a), words_of(b)) >= DUPLICATE_SIMILARITY:
+            parent[root(b)] = root(a)
+
+    groups = {}
+    for memory_id in parent:
+        groups.setdefault(root(memory_id), set()).update((memory_id, root(memory_id)))
+    return [sorted((rows[i] for i in group), key=lambda row: (row["ts"], row["id"])) for group in groups.values()]
+
+
+def compact(user_id: str | None = None, dry_run: bool = False) -> dict:
+    """
+    Merge existing near-duplicates: the newest row of each group survives with every tag
+    in the group, the rest are deleted. The survivor's embedding is recomputed on next load.
+    """
+    with db.transaction() as conn:
+        signed = sign_unsigned(conn)
+    groups = _find_groups(user_id)
+
+    removed = 0
+    for group in groups:
+        keep, duplicates = group[-1], group[:-1]
+        if DEBUG:
+            print(f"KEEP {keep['id']}: {keep['content']!r}")
+            for row in duplicates:
+                print(f"  MERGE {row['id']}: {row['content']!r}")
+        removed += len(duplicates)
+        if dry_run:
+            continue
+        tags = merge_tags(keep["tags"], *(row["tags"] for row in duplicates))
+        with db.transaction() as conn:
+            if tags != json.loads(keep["tags"] or "[]"):
+                conn.execute(MERGE_TAGS_SQL, (json.dumps(tags), keep["id"]))
+            for row in duplicates:
+                conn.execute(DELETE_BUCKETS_SQL, (row["id"],))
+                conn.execute(DELETE_MEMORY_SQL, (row["id"],))
+        vector_index.invalidate(keep["user_id"])
+
+    metrics.incr("memory_dedup.compacted", removed)
+    return {"signed": signed, "groups": len(groups), "removed": removed}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Merge near-duplicate long-term memories.")
+    parser.add_argument("--user", help="only this user's memories")
+    parser.add_argument("--dry-run", action="store_true", help="list the merges without changing anything")
+    args = parser.parse_args()
+
+    db.init_db()
+    try:
+        result = compact(args.user.lower() if args.user else None, args.dry_run)
+    finally:
+        db.close_db()
+    action = "would remove" if args.dry_run else "removed"
+    print(f"signed {result['signed']} memories, {result['groups']} duplicate groups, {action} {result['removed']} rows")
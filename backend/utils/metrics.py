@@ -0,0 +1,51 @@
+# alfred/backend/utils/metrics.py
+
+# In-process counters and timings, exposed by GET /metrics in main.py.
+
+import threading
+from collections import defaultdict
+
+_lock = threading.Lock()
+_counters = defaultdict(int)
+_timings = {}
+
+
+def incr(name: str, amount: int = 1):
+    with _lock:
+        _counters[name] += amount
+
+
+def observe(name: str, seconds: float):
+    with _lock:
+        stat = _timings.get(name)
+        if stat is None:
+            stat = _timings[name] = {"count": 0, "total": 0.0, "max": 0.0}
+        stat["count"] += 1
+        stat["total"] += seconds
+        stat["max"] = max(stat["max"], seconds)
+
+
+def counter(name: str) -> int:
+    with _lock:
+        return _counters.get(name, 0)
+
+
+def snapshot() -> dict:
+    with _lock:
+        return {
+            "counters": dict(_counters),
+            "timings": {
+                name: {
+                    "count": stat["count"],
+                    "avg_ms": round(stat["total"] / stat["count"] * 1000, 3),
+                    "max_ms": round(stat["max"] * 1000, 3),
+                }
+                for name, stat in _timings.items()
+            },
+        }
+
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _timings.clear()
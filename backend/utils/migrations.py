@@ -0,0 +1,248 @@
+# alfred/backend/utils/migrations.py
+
+# Versioned schema migrations. The applied version is tracked in SQLite's
+# PRAGMA user_version; each migration runs once, in order, in its own transaction.
+# To change the schema, append a new (version, description, function) entry to MIGRATIONS.
+
+import sqlite3
+
+from utils.db import to_ms
+
+DEBUG = True
+
+
+def _create_base_tables(conn: sqlite3.Connection):
+    # Table for long-term memory
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS longterm_memory (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp TEXT NOT NULL,
+            user_id TEXT NOT NULL,
+            content TEXT NOT NULL,
+            summary TEXT,
+            tags TEXT
+        )
+    ''')
+    # Table for chat history
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS chat_history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp TEXT NOT NULL,
+            role TEXT NOT NULL,
+            content TEXT NOT NULL,
+            user_id TEXT NOT NULL,
+            session_id TEXT NOT NULL
+        )
+    ''')
+    # Table for tasks
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS tasks (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp TEXT NOT NULL,
+            user_id TEXT NOT NULL,
+            category TEXT NOT NULL,
+            task TEXT NOT NULL,
+            due_date TEXT,
+            recurrence TEXT,
+            completed INTEGER DEFAULT 0,
+            notes TEXT
+        )
+    ''')
+
+
+def _backfill_ms(conn: sqlite3.Connection, table: str, source: str, target: str):
+    rows = conn.execute(f"SELECT id, {source} FROM {table}").fetchall()
+    conn.executemany(
+        f"UPDATE {table} SET {target} = ? WHERE id = ?",
+        ((to_ms(row[1]), row[0]) for row in rows),
+    )
+
+
+def _add_sortable_timestamps(conn: sqlite3.Connection):
+    # ISO strings stay for display; the integer columns are what queries sort on.
+    conn.execute("ALTER TABLE chat_history ADD COLUMN ts INTEGER NOT NULL DEFAULT 0")
+    conn.execute("ALTER TABLE longterm_memory ADD COLUMN ts INTEGER NOT NULL DEFAULT 0")
+    conn.execute("ALTER TABLE tasks ADD COLUMN ts INTEGER NOT NULL DEFAULT 0")
+    conn.execute("ALTER TABLE tasks ADD COLUMN due_ts INTEGER")
+
+    _backfill_ms(conn, "chat_history", "timestamp", "ts")
+    _backfill_ms(conn, "longterm_memory", "timestamp", "ts")
+    _backfill_ms(conn, "tasks", "timestamp", "ts")
+    _backfill_ms(conn, "tasks", "due_date", "due_ts")
+
+    # load_chat_history: WHERE user_id = ? [AND session_id = ?] ORDER BY ts DESC LIMIT ?
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_chat_history_user_session_ts ON chat_history (user_id, session_id, ts)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_chat_history_user_ts ON chat_history (user_id, ts)")
+    # get_tasks: WHERE user_id = ? ORDER BY due_ts
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_tasks_user_due ON tasks (user_id, due_ts)")
+    # load_longterm_memory: WHERE user_id = ? ORDER BY ts DESC
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_longterm_memory_user_ts ON longterm_memory (user_id, ts)")
+    conn.execute("ANALYZE")
+
+
+def _add_router_cache(conn: sqlite3.Connection):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS router_cache (
+            prompt_key TEXT PRIMARY KEY,
+            decision TEXT NOT NULL,
+            created_ts INTEGER NOT NULL
+        )
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_router_cache_created ON router_cache (created_ts)")
+
+
+def _add_geocode_cache(conn: sqlite3.Connection):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS geocode_cache (
+            query_key TEXT PRIMARY KEY,
+            lat REAL NOT NULL,
+            lon REAL NOT NULL,
+            created_ts INTEGER NOT NULL
+        )
+    ''')
+
+
+def _add_memory_search_index(conn: sqlite3.Connection):
+    # External-content FTS5 index over longterm_memory, kept in sync by triggers.
+    # user_id is deliberately not indexed: a per-user term would match every row the
+    # user owns and make each query intersect that whole posting list; the JOIN filters instead.
+    conn.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS longterm_memory_fts USING fts5(
+            content, summary, tags,
+            content='longterm_memory', content_rowid='id',
+            tokenize='porter unicode61'
+        )
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS longterm_memory_fts_insert AFTER INSERT ON longterm_memory BEGIN
+            INSERT INTO longterm_memory_fts (rowid, content, summary, tags)
+            VALUES (new.id, new.content, new.summary, new.tags);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS longterm_memory_fts_delete AFTER DELETE ON longterm_memory BEGIN
+            INSERT INTO longterm_memory_fts (longterm_memory_fts, rowid, content, summary, tags)
+            VALUES ('delete', old.id, old.content, old.summary, old.tags);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS longterm_memory_fts_update AFTER UPDATE ON longterm_memory BEGIN
+            INSERT INTO longterm_memory_fts (longterm_memory_fts, rowid, content, summary, tags)
+            VALUES ('delete', old.id, old.content, old.summary, old.tags);
+            INSERT INTO longterm_memory_fts (rowid, content, summary, tags)
+            VALUES (new.id, new.content, new.summary, new.tags);
+        END
+    ''')
+    conn.execute("INSERT INTO longterm_memory_fts (longterm_memory_fts) VALUES ('rebuild')")
+
+
+def _add_memory_embeddings(conn: sqlite3.Connection):
+    # Vectors are filled in by utils.vector_index: on insert, or lazily the first time a user's index loads.
+    conn.execute("ALTER TABLE longterm_memory ADD COLUMN embedding BLOB")
+    conn.execute("ALTER TABLE longterm_memory ADD COLUMN embedding_model TEXT")
+    # Writing an embedding must not re-index the row in FTS, so only fire on the indexed columns
+    conn.execute("DROP TRIGGER IF EXISTS longterm_memory_fts_update")
+    conn.execute('''
+        CREATE TRIGGER longterm_memory_fts_update AFTER UPDATE OF content, summary, tags ON longterm_memory BEGIN
+            INSERT INTO longterm_memory_fts (longterm_memory_fts, rowid, content, summary, tags)
+            VALUES ('delete', old.id, old.content, old.summary, old.tags);
+            INSERT INTO longterm_memory_fts (rowid, content, summary, tags)
+            VALUES (new.id, new.content, new.summary, new.tags);
+        END
+    ''')
+
+
+def _add_task_filter_indexes(conn: sqlite3.Connection):
+    # get_tasks(status=...): WHERE user_id = ? AND completed = ? ORDER BY due_ts, id
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_tasks_user_completed_due ON tasks (user_id, completed, due_ts)")
+    # get_tasks(category=...): WHERE user_id = ? AND category = ? ORDER BY due_ts, id
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_tasks_user_category_due ON tasks (user_id, category, due_ts)")
+    conn.execute("ANALYZE tasks")
+
+
+def _add_reminder_index(conn: sqlite3.Connection):
+    # Reminder scheduler refill: WHERE completed = 0 AND due_ts BETWEEN ? AND ?, across all users
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_tasks_completed_due ON tasks (completed, due_ts)")
+
+
+def _add_session_summaries(conn: sqlite3.Connection):
+    # Rolling summary of the turns that no longer fit in alfred_node's context; covered_id is the newest chat_history row it includes
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS session_summaries (
+            user_id TEXT NOT NULL,
+            session_id TEXT NOT NULL,
+            summary TEXT NOT NULL,
+            covered_id INTEGER NOT NULL,
+            updated_ts INTEGER NOT NULL,
+            PRIMARY KEY (user_id, session_id)
+        )
+    ''')
+
+
+def _add_chat_history_id_indexes(conn: sqlite3.Connection):
+    # GET /history pages by id: WHERE user_id = ? [AND session_id = ?] AND id < ? | id > ? ORDER BY id
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_chat_history_user_session_id ON chat_history (user_id, session_id, id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_chat_history_user_id ON chat_history (user_id, id)")
+    # Without fresh stats the planner keeps the older (user_id, session_id, ts) index and sorts in a temp B-tree
+    conn.execute("ANALYZE chat_history")
+
+
+def _add_memory_minhash(conn: sqlite3.Connection):
+    # Near-duplicate check on save (utils/memory_dedup.py): a MinHash signature per memory and one row per LSH band.
+    # save looks up WHERE user_id = ? AND bucket IN (...); merges delete by memory_id.
+    conn.execute("ALTER TABLE longterm_memory ADD COLUMN minhash BLOB")
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS memory_lsh (
+            user_id TEXT NOT NULL,
+            bucket INTEGER NOT NULL,
+            memory_id INTEGER NOT NULL,
+            PRIMARY KEY (user_id, bucket, memory_id)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_memory_lsh_memory ON memory_lsh (memory_id)")
+
+    from utils.memory_dedup import sign_unsigned
+    sign_unsigned(conn)
+
+
+MIGRATIONS = [
+    (1, "base tables", _create_base_tables),
+    (2, "integer timestamps and query indexes", _add_sortable_timestamps),
+    (3, "router decision cache", _add_router_cache),
+    (4, "geocode cache", _add_geocode_cache),
+    (5, "full-text index for long-term memory", _add_memory_search_index),
+    (6, "embedding vectors for long-term memory", _add_memory_embeddings),
+    (7, "task filter indexes", _add_task_filter_indexes),
+    (8, "reminder scheduler index", _add_reminder_index),
+    (9, "session summaries", _add_session_summaries),
+    (10, "chat history id indexes", _add_chat_history_id_indexes),
+    (11, "near-duplicate signatures for long-term memory", _add_memory_minhash),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def get_version(conn: sqlite3.Connection) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn: sqlite3.Connection, target: int = LATEST_VERSION) -> int:
+    """
+    Apply every pending migration up to target and return the resulting schema version.
+    """
+    current = get_version(conn)
+    for version, description, apply in MIGRATIONS:
+        if version <= current or version > target:
+            continue
+        if DEBUG:
+            print(f"APPLYING MIGRATION {version}: {description}")
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            apply(conn)
+            conn.execute(f"PRAGMA user_version = {version}")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        current = version
+    return current
@@ -0,0 +1,150 @@
+# alfred/backend/utils/models.py
+
+# Every LLM and embedding client the app uses, created once and shared.
+# Modules call ollama(temperature=...) / openai() / ollama_embeddings() instead of constructing
+# their own client: identical settings return the same instance, and every Ollama client
+# shares one ollama.AsyncClient, i.e. one connection pool to the Ollama server.
+# At startup warm_up() loads each Ollama model with an empty request, so the first chat after a
+# restart doesn't pay the model-load time. Every request passes OLLAMA_KEEP_ALIVE, so the
+# models stay resident between requests. GET /ready answers 200 only after all of them loaded.
+
+import asyncio
+import os
+import time
+
+from langchain_ollama import ChatOllama, OllamaEmbeddings
+from langchain_openai import ChatOpenAI
+from ollama import AsyncClient
+
+from utils import metrics
+
+DEBUG = True
+
+OLLAMA_MODEL = os.getenv("OLLAMA_MODEL")
+OPENAI_MODEL = os.getenv("OPENAI_MODEL")
+OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL") or None
+
+
+def _seconds(duration: str) -> int:
+    """'90', '90s', '30m', '2h' -> seconds. Negative keeps the model loaded forever."""
+    duration = duration.strip().lower()
+    unit = {"s": 1, "m": 60, "h": 3600}.get(duration[-1:])
+    return int(float(duration[:-1]) * unit) if unit else int(duration)
+
+
+# How long Ollama keeps a model loaded after a request; every client sends it so the models stay resident
+KEEP_ALIVE = _seconds(os.getenv("OLLAMA_KEEP_ALIVE") or "30m")
+
+WARM_UP_TIMEOUT = 120  # seconds; a cold 8B model can take a while to load from disk
+WARM_UP_RETRY = 15     # seconds between attempts while Ollama is unreachable
+
+_clients = {}
+_ollama_client = None
+_status = {}           # ollama model -> {"resident", "load_s", "error"}
+_warm_up_task = None
+
+
+def _shared_ollama_client() -> AsyncClient:
+    global _ollama_client
+    if _ollama_client is None:
+        _ollama_client = AsyncClient(host=OLLAMA_BASE_URL)
+    return _ollama_client
+
+
+def _get(key: tuple, build):
+    client = _clients.get(key)
+    if client is None:
+        client = _clients[key] = build()
+    return client
+
+
+def ollama(model: str = None, **settings) -> ChatOllama:
+    model = model or OLLAMA_MODEL
+
+    def build():
+        llm = ChatOllama(model=model, base_url=OLLAMA_BASE_URL, keep_alive=KEEP_ALIVE, **settings)
+        llm._async_client = _shared_ollama_client()
+        return llm
+
+    _status.setdefault(model, {"resident": False, "load_s": None, "error": None})
+    return _get(("ollama", model, tuple(sorted(settings.items()))), build)
+
+
+def openai(model: str = None, **settings) -> ChatOpenAI:
+    model = model or OPENAI_MODEL
+    return _get(("openai", model, tuple(sorted(settings.items()))),
+                lambda: ChatOpenAI(model=model, **settings))
+
+
+def ollama_embeddings(model: str) -> OllamaEmbeddings:
+    def build():
+        embedder = OllamaEmbeddings(model=model, base_url=OLLAMA_BASE_URL, keep_alive=KEEP_ALIVE)
+        embedder._async_client = _shared_ollama_client()
+        return embedder
+
+    _status.setdefault(model, {"resident": False, "load_s": None, "error": None, "embedding": True})
+    return _get(("embeddings", model), build)
+
+
+async def _load(model: str):
+    state = _status[model]
+    start = time.perf_counter()
+    client = _shared_ollama_client()
+    while True:
+        try:
+            # An empty request loads the model without generating anything
+            if state.get("embedding"):
+                request = client.embed(model=model, input="", keep_alive=KEEP_ALIVE)
+            else:
+                request = client.generate(model=model, prompt="", keep_alive=KEEP_ALIVE)
+            await asyncio.wait_for(request, WARM_UP_TIMEOUT)
+            break
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            state["error"] = str(e) or type(e).__name__
+            metrics.incr("models.warm_up_failed")
+            print(f"Warming up {model} failed, retrying in {WARM_UP_RETRY}s: {state['error']}")
+            await asyncio.sleep(WARM_UP_RETRY)
+    state.update(resident=True, load_s=round(time.perf_counter() - start, 2), error=None)
+    metrics.observe("models.warm_up", time.perf_counter() - start)
+    if DEBUG:
+        print(f"[DEBUG] {model} loaded in {state['load_s']:.2f}s (keep_alive {KEEP_ALIVE})")
+
+
+async def _load_all():
+    await asyncio.gather(*(_load(model) for model, state in _status.items() if not state["resident"]))
+
+
+async def warm_up():
+    """Start loading every registered Ollama model in the background; ready() turns true when all are loaded."""
+    global _warm_up_task
+    if _warm_up_task is None or _warm_up_task.done():
+        _warm_up_task = asyncio.create_task(_load_all(), name="model-warm-up")
+
+
+def ready() -> bool:
+    return all(state["resident"] for state in _status.values())
+
+
+def status() -> dict:
+    return {
+        "ready": ready(),
+        "keep_alive": KEEP_ALIVE,
+        "models": {model: dict(state) for model, state in _status.items()},
+        "openai": sorted({key[1] for key in _clients if key[0] == "openai"}),
+    }
+
+
+async def close():
+    global _ollama_client, _warm_up_task
+    if _warm_up_task is not None:
+        _warm_up_task.cancel()
+        try:
+            await _warm_up_task
+        except asyncio.CancelledError:
+            pass
+        _warm_up_task = None
+    if _ollama_client is not None:
+        await _ollama_client.close()
+        _ollama_client = None
@@ -0,0 +1,259 @@
+# alfred/backend/utils/scheduler.py
+
+# Recurring tasks and reminders.
+# Recurrence strings ("daily", "weekly", "bi-weekly", "every 3 days", "every monday and thursday",
+# "weekdays", ...) are evaluated lazily:
+# only a task's next occurrence exists as a row, and completing it creates the one after.
+# ReminderScheduler keeps the open tasks due within the next few hours in a heap ordered by
+# due time and sleeps until the earliest one, instead of polling the table. The window is
+# refilled from the (completed, due_ts) index as it runs out, so memory stays bounded no
+# matter how many users or tasks there are. Fired reminders wait in a small per-user deque
+# until the frontend picks them up from GET /reminders.
+
+import asyncio
+import calendar
+import heapq
+import os
+import re
+from collections import deque
+from datetime import datetime, timedelta
+
+from utils import db, metrics
+from utils.cache import TTLCache
+
+DEBUG = True
+
+HORIZON_MS = int(float(os.getenv("REMINDER_HORIZON_HOURS") or 6) * 3600 * 1000)
+MAX_PENDING_PER_USER = 50
+PENDING_USERS = 10000
+PENDING_TTL = 24 * 3600
+
+DUE_TASKS_SQL = '''
+    SELECT id, user_id, task, due_ts
+    FROM tasks
+    WHERE completed = 0 AND due_ts > ? AND due_ts <= ?
+    ORDER BY due_ts
+'''
+
+RECURRENCE_ALIASES = {
+    "daily": (1, "day"),
+    "weekly": (1, "week"),
+    "biweekly": (2, "week"),
+    "fortnightly": (2, "week"),
+    "monthly": (1, "month"),
+    "bimonthly": (2, "month"),
+    "quarterly": (3, "month"),
+    "yearly": (1, "year"),
+    "annually": (1, "year"),
+}
+
+NO_RECURRENCE = {"", "once", "one time", "onetime", "none", "never", "no"}
+
+WEEKDAY_NAMES = ("monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday")
+WEEKDAY_GROUPS = {"weekday": (0, 1, 2, 3, 4), "weekend": (5, 6)}
+
+_RECURRENCE_RE = re.compile(r"^(?:every\s+)?(?:(\d+|other)\s+)?(day|week|month|year)s?$")
+_WEEKDAY_LIST_RE = re.compile(r"^(?:(?:every|each|on)\s+)?(.+)$")
+_WEEKDAY_SPLIT_RE = re.compile(r"\s*(?:,|&|/|\band\b)\s*")
+
+
+def _weekday(word: str) -> tuple | None:
+    word = word.strip()
+    if word.endswith("s") and (word[:-1] in WEEKDAY_GROUPS or word[:-1] in WEEKDAY_NAMES):
+        word = word[:-1]  # "mondays", "weekends"
+    if word in WEEKDAY_GROUPS:
+        return WEEKDAY_GROUPS[word]
+    for number, name in enumerate(WEEKDAY_NAMES):
+        # full names and the usual abbreviations: mon, tue, tues, wed, thu, thur, thurs, ...
+        if word == name or (len(word) >= 3 and name.startswith(word) and len(word) <= 5):
+            return (number,)
+    return None
+
+
+def parse_recurrence(text: str) -> tuple | None:
+    """
+    (count, unit) for a recurrence string, or (weekdays, "weekday") for ones like "every monday
+    and thursday" (weekdays is a tuple of 0=Monday..6). None for 'once' and anything unrecognised.
+    """
+    text = (text or "").strip().lower().replace("-", "")
+    if text in RECURRENCE_ALIASES:
+        return RECURRENCE_ALIASES[text]
+    match = _RECURRENCE_RE.match(text)
+    if match:
+        count = match.group(1)
+        count = 2 if count == "other" else int(count or 1)
+        return (count, match.group(2)) if count > 0 else None
+    days = set()
+    for word in _WEEKDAY_SPLIT_RE.split(_WEEKDAY_LIST_RE.match(text).group(1)) if text else ():
+        found = _weekday(word)
+        if found is None:
+            return None
+        days.update(found)
+    return (tuple(sorted(days)), "weekday") if days else None
+
+
+def check_recurrence(text: str) -> str:
+    """The recurrence as given if it is 'once' or parse_recurrence understands it; ValueError otherwise."""
+    if (text or "").strip().lower() in NO_RECURRENCE or parse_recurrence(text) is not None:
+        return text
+    raise ValueError(
+        f"Unsupported recurrence '{text}'. Use 'once', 'daily', 'weekly', 'bi-weekly', 'monthly', 'yearly', "
+        "'every N days/weeks/months', or weekdays such as 'every monday and thursday' or 'weekdays' "
+        "(for 'twice a week', pick the days)"
+    )
+
+
+def _add_months(value: datetime, months: int) -> datetime:
+    month = value.month - 1 + months
+    year = value.year + month // 12
+    month = month % 12 + 1
+    day = min(value.day, calendar.monthrange(year, month)[1])
+    return value.replace(year=year, month=month, day=day)
+
+
+def _step(value: datetime, count: int, unit: str) -> datetime:
+    if unit == "day":
+        return value + timedelta(days=count)
+    if unit == "week":
+        return value + timedelta(weeks=count)
+    if unit == "month":
+        return _add_months(value, count)
+    return _add_months(value, 12 * count)
+
+
+def next_occurrence(due: datetime, recurrence: str, after: datetime = None) -> datetime | None:
+    """
+    The first occurrence of a recurring task after `after` (default: after `due`), or None if it doesn't repeat.
+    Missed occurrences are skipped rather than piling up.
+    """
+    rule = parse_recurrence(recurrence)
+    if rule is None:
+        return None
+    count, unit = rule
+    after = max(after or due, due)
+    if unit == "weekday":
+        # Same time of day, on the first listed weekday after `after`
+        occurrence = due + timedelta(days=max(0, (after - due).days))
+        while occurrence <= after or occurrence.weekday() not in count:
+            occurrence += timedelta(days=1)
+        return occurrence
+    occurrence = _step(due, count, unit)
+    steps = 1
+    while occurrence <= after:
+        steps += 1
+        # step from the original date so month-end clamping doesn't drift (Jan 31 -> Feb 28 -> Mar 31)
+        occurrence = _step(due, count * steps, unit)
+    return occurrence
+
+
+class ReminderScheduler:
+    def __init__(self, horizon_ms: int = HORIZON_MS):
+        self.horizon_ms = horizon_ms
+        self._heap = []          # (due_ts, task_id, user_id, task)
+        self._scheduled = set()  # task ids in the heap
+        self._cancelled = set()  # completed while waiting in the heap; skipped when popped
+        self._loaded_until = 0
+        self._pending = TTLCache(PENDING_USERS, PENDING_TTL)
+        self._wake = None
+        self._task = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def start(self):
+        if self.running:
+            return
+        self._wake = asyncio.Event()
+        self._loaded_until = db.now_ms()
+        await self._refill()
+        self._task = asyncio.create_task(self._run(), name="reminder-scheduler")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def _push(self, task_id: int, user_id: str, task: str, due_ts: int):
+        if task_id in self._scheduled:
+            return
+        heapq.heappush(self._heap, (due_ts, task_id, user_id, task))
+        self._scheduled.add(task_id)
+
+    def schedule(self, task_id: int, user_id: str, task: str, due_ts: int | None):
+        """Called when a task is created. Tasks beyond the loaded window are picked up by a later refill."""
+        if due_ts is None or due_ts <= db.now_ms() or due_ts > self._loaded_until:
+            return
+        self._push(task_id, user_id, task, due_ts)
+        if self._wake is not None:
+            self._wake.set()
+
+    def cancel(self, task_id: int):
+        """Called when a task is completed before its reminder fired."""
+        if task_id in self._scheduled:
+            self._cancelled.add(task_id)
+
+    async def _refill(self):
+        until = db.now_ms() + self.horizon_ms
+        rows = await db.afetchall(DUE_TASKS_SQL, (self._loaded_until, until))
+        for row in rows:
+            self._push(row["id"], row["user_id"], row["task"], row["due_ts"])
+        self._loaded_until = until
+        if DEBUG:
+            print(f"REMINDER SCHEDULER LOADED {len(rows)} TASKS, {len(self._heap)} WAITING")
+
+    def _fire(self, due_ts: int, task_id: int, user_id: str, task: str):
+        self._scheduled.discard(task_id)
+        if task_id in self._cancelled:
+            self._cancelled.discard(task_id)
+            return
+        pending = self._pending.get(user_id)
+        if pending is None:
+            pending = deque(maxlen=MAX_PENDING_PER_USER)
+            self._pending.set(user_id, pending)
+        pending.append({
+            "task_id": task_id,
+            "task": task,
+            "due_date": datetime.fromtimestamp(due_ts / 1000).isoformat(),
+        })
+        metrics.incr("reminders.fired")
+        if DEBUG:
+            print(f"REMINDER FOR {user_id}: {task}")
+
+    async def _run(self):
+        while True:
+            try:
+                now = db.now_ms()
+                refill_at = self._loaded_until - self.horizon_ms // 2
+                if now >= refill_at:
+                    await self._refill()
+                    refill_at = self._loaded_until - self.horizon_ms // 2
+                while self._heap and self._heap[0][0] <= now:
+                    self._fire(*heapq.heappop(self._heap))
+
+                wake_at = min(self._heap[0][0], refill_at) if self._heap else refill_at
+                self._wake.clear()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout=max(0.0, (wake_at - now) / 1000))
+                except asyncio.TimeoutError:
+                    pass
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Error in reminder scheduler: {e}")
+                await asyncio.sleep(5)
+
+    def pending(self, user_id: str) -> list:
+        """Fired reminders for the user that haven't been delivered yet. Delivering clears them."""
+        pending = self._pending.pop(user_id.lower())
+        return list(pending) if pending else []
+
+    def stats(self) -> dict:
+        return {"waiting": len(self._heap), "loaded_until": self._loaded_until}
+
+
+reminders = ReminderScheduler()
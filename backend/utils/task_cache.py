@@ -0,0 +1,139 @@
+# alfred/backend/utils/task_cache.py
+
+# Per-user in-memory view of each user's open tasks. Loaded from SQLite the first time a user's
+# tasks are read, then kept current by create_new_task / mark_task_completed (write-through),
+# so repeated get_tasks calls within a graph run and across requests never touch the database.
+# Completed tasks drop out of the view; queries for them go to SQLite.
+# Tasks are kept sorted by (due_ts, id), so due-date windows and cursors are a bisect away,
+# and each distinct query's JSON is built once per version of the list.
+
+import bisect
+
+from utils import db
+from utils.cache import TTLCache, SingleFlight
+
+DEBUG = True
+
+CACHE_USERS = 1024
+CACHE_TTL = 3600
+
+OPEN_TASKS_SQL = '''
+    SELECT id, timestamp, category, task, due_date, due_ts, recurrence, completed
+    FROM tasks
+    WHERE user_id = ? AND completed = 0
+    ORDER BY due_ts ASC, id ASC
+'''
+
+
+def sort_key(due_ts, task_id: int) -> tuple:
+    # SQLite sorts NULL first
+    return (-1 if due_ts is None else due_ts, task_id)
+
+
+class TaskView:
+    def __init__(self, rows: list):
+        self.tasks = []
+        self.keys = []
+        self.version = 0
+        self._serialized = {}
+        for row in rows:
+            task = dict(row)
+            self.keys.append(sort_key(task.pop("due_ts"), task["id"]))
+            self.tasks.append(task)
+
+    def _changed(self):
+        self.version += 1
+        self._serialized.clear()
+
+    def add(self, task: dict, due_ts):
+        key = sort_key(due_ts, task["id"])
+        position = bisect.bisect_left(self.keys, key)
+        self.keys.insert(position, key)
+        self.tasks.insert(position, task)
+        self._changed()
+
+    def remove(self, task_id: int) -> bool:
+        for position, task in enumerate(self.tasks):
+            if task["id"] == task_id:
+                del self.keys[position]
+                del self.tasks[position]
+                self._changed()
+                return True
+        return False
+
+    def query(self, due_from: int = None, due_to: int = None, category: str = None,
+              limit: int = None, after: tuple = None) -> tuple:
+        """
+        Open tasks due in [due_from, due_to], optionally in one category, starting after the
+        `after` sort key. Returns (tasks, sort key of the last task if there are more, else None).
+        """
+        start = bisect.bisect_left(self.keys, (due_from, -1)) if due_from is not None else 0
+        if after is not None:
+            start = max(start, bisect.bisect_right(self.keys, after))
+        end = bisect.bisect_right(self.keys, (due_to, float("inf"))) if due_to is not None else len(self.keys)
+
+        found, last = [], None
+        for position in range(start, end):
+            task = self.tasks[position]
+            if category and task["category"] != category:
+                continue
+            if limit is not None and len(found) >= limit:
+                return found, self.keys[last] if last is not None else after
+            found.append(task)
+            last = position
+        return found, None
+
+    def serialized(self, key, build) -> str:
+        """JSON for a query, built at most once per version of the list."""
+        if key not in self._serialized:
+            self._serialized[key] = build()
+        return self._serialized[key]
+
+
+_views = TTLCache(CACHE_USERS, CACHE_TTL)
+_loading = SingleFlight()
+# Bumped on every write so a load that raced with a write is not cached
+_generation = {}
+
+
+async def _load(user_id: str) -> TaskView:
+    generation = _generation.get(user_id, 0)
+    view = TaskView(await db.afetchall(OPEN_TASKS_SQL, (user_id,)))
+    if _generation.get(user_id, 0) == generation:
+        _views.set(user_id, view)
+    if DEBUG:
+        print(f"TASK CACHE LOADED {len(view.tasks)} OPEN TASKS FOR {user_id}")
+    return view
+
+
+async def get(user_id: str) -> TaskView:
+    user_id = user_id.lower()
+    view = _views.get(user_id)
+    if view is None:
+        view = await _loading.do(user_id, lambda: _load(user_id))
+    return view
+
+
+def _written(user_id: str):
+    _generation[user_id] = _generation.get(user_id, 0) + 1
+
+
+def added(user_id: str, task: dict, due_ts):
+    """Write-through for a newly inserted task (task holds the OPEN_TASKS_SQL columns except due_ts)."""
+    user_id = user_id.lower()
+    _written(user_id)
+    view = _views.get(user_id)
+    if view is not None:
+        view.add(task, due_ts)
+
+
+def completed(user_id: str, task_id: int):
+    user_id = user_id.lower()
+    _written(user_id)
+    view = _views.get(user_id)
+    if view is not None:
+        view.remove(task_id)
+
+
+def invalidate(user_id: str):
+    _views.pop(user_id.lower())
@@ -0,0 +1,118 @@
+# alfred/backend/utils/task_matcher.py
+
+# Resolves "mark the lawn task done" to a task id without an LLM call.
+# Open tasks are put in a small inverted token index; tasks sharing a word with the query
+# are scored on token overlap plus a sorted-token fuzzy ratio (like rapidfuzz's token_sort_ratio),
+# with a bonus for tasks due soon. A clear winner is returned directly; close calls
+# are reported as ambiguous so the caller can ask the LLM to pick between just those candidates.
+
+import re
+import time
+from difflib import SequenceMatcher
+
+from utils import db
+
+DEBUG = True
+
+ACCEPT_SCORE = 0.55   # best match must score at least this...
+ACCEPT_MARGIN = 0.15  # ...and beat the runner-up by this much to be taken without the LLM
+REJECT_SCORE = 0.25   # below this nothing is considered a match
+DUE_BOOST = 0.1       # tasks due today get the full boost, fading to nothing DUE_WINDOW_DAYS away
+DUE_WINDOW_DAYS = 7
+MAX_CANDIDATES = 5
+
+DAY_MS = 24 * 3600 * 1000
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+# Words that say what to do with the task rather than which task it is
+STOPWORDS = frozenset("""
+    a an the to my our i we me please mark marked set as is it its that this of for on in
+    done complete completed completing finish finished task tasks todo item already have has did
+    just off check checked cross crossed
+""".split())
+
+
+def _stem(word: str) -> str:
+    for suffix in ("ing", "ed", "es", "s"):
+        if len(word) > len(suffix) + 2 and word.endswith(suffix):
+            return word[: -len(suffix)]
+    return word
+
+
+def tokens(text: str) -> list:
+    return [_stem(w) for w in _WORD_RE.findall((text or "").lower()) if w not in STOPWORDS]
+
+
+def _due_boost(task: dict, now_ms: int) -> float:
+    try:
+        due_ms = db.to_ms(task.get("due_date"))
+    except ValueError:
+        return 0.0
+    if due_ms is None:
+        return 0.0
+    days = abs(due_ms - now_ms) / DAY_MS
+    return DUE_BOOST * max(0.0, 1.0 - days / DUE_WINDOW_DAYS)
+
+
+def score(query_tokens: list, task_tokens: list) -> float:
+    if not query_tokens or not task_tokens:
+        return 0.0
+    q, t = set(query_tokens), set(task_tokens)
+    dice = 2 * len(q & t) / (len(q) + len(t))
+    fuzzy = SequenceMatcher(None, " ".join(sorted(q)), " ".join(sorted(t))).ratio()
+    return 0.6 * dice + 0.4 * fuzzy
+
+
+def rank(query: str, tasks: list, now_ms: int = None) -> list:
+    """
+    (score, task) pairs for the open tasks that plausibly match the query, best first.
+    """
+    now_ms = now_ms or db.now_ms()
+    query_tokens = tokens(query)
+    open_tasks = [task for task in tasks if not task.get("completed")]
+    task_tokens = [tokens(task["task"]) for task in open_tasks]
+
+    index = {}
+    for i, words in enumerate(task_tokens):
+        for word in words:
+            index.setdefault(word, set()).add(i)
+    candidates = set()
+    for word in query_tokens:
+        candidates |= index.get(word, set())
+    if not candidates:
+        # No shared word: the query may be misspelt, so fall back to fuzzy-scoring everything
+        candidates = range(len(open_tasks))
+
+    ranked = []
+    for i in candidates:
+        value = score(query_tokens, task_tokens[i])
+        if value >= REJECT_SCORE:
+            ranked.append((value + _due_boost(open_tasks[i], now_ms), open_tasks[i]))
+    ranked.sort(key=lambda pair: pair[0], reverse=True)
+    return ranked
+
+
+def match(query: str, tasks: list) -> tuple:
+    """
+    Returns (task_id, candidates): task_id is set when one open task clearly matches;
+    otherwise candidates holds the closest tasks for the LLM to choose from (empty if none are close).
+    """
+    if DEBUG:
+        start = time.perf_counter()
+
+    ranked = rank(query, tasks)
+    task_id, candidates = None, []
+    if ranked:
+        best = ranked[0][0]
+        runner_up = ranked[1][0] if len(ranked) > 1 else 0.0
+        if best >= ACCEPT_SCORE and best - runner_up >= ACCEPT_MARGIN:
+            task_id = ranked[0][1]["id"]
+        else:
+            candidates = [task for _, task in ranked[:MAX_CANDIDATES]]
+
+    if DEBUG:
+        duration = (time.perf_counter() - start) * 1000
+        print(f"[DEBUG] task match for '{query}': id={task_id}, {len(candidates)} candidates in {duration:.3f}ms")
+    return task_id, candidates
+
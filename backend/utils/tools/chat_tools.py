@@ -1,39 +1,132 @@
 # alfred/backend/utils/tools/chat_tools.py
 
 from datetime import datetime
-from utils.db import get_db_connection
+from collections import deque
+from utils import db, metrics
+from utils.cache import TTLCache
+from utils.write_queue import WriteBehindQueue
+import itertools
 import time
-import asyncio
 
 DEBUG = True
 
+INSERT_CHAT_SQL = '''
+    INSERT INTO chat_history (
+        id, timestamp, ts, role, content, user_id, session_id
+    ) VALUES (?, ?, ?, ?, ?, ?, ?)
+'''
+
+MAX_CHAT_ID_SQL = 'SELECT COALESCE(MAX(id), 0) AS id FROM chat_history'
+
+# /history pages; {scope} is "user_id = ?" or "user_id = ? AND session_id = ?"
+LATEST_ID_SQL = 'SELECT COALESCE(MAX(id), 0) AS id FROM chat_history WHERE {scope}'
+PAGE_BEFORE_SQL = '''
+    SELECT id, timestamp, role, content, session_id
+    FROM chat_history
+    WHERE {scope} AND id < ?
+    ORDER BY id DESC
+    LIMIT ?
+'''
+PAGE_SINCE_SQL = '''
+    SELECT id, timestamp, role, content, session_id
+    FROM chat_history
+    WHERE {scope} AND id > ?
+    ORDER BY id ASC
+    LIMIT ?
+'''
+
+SESSION_HISTORY_SQL = '''
+    SELECT id, timestamp, role, content
+    FROM chat_history
+    WHERE user_id = ? AND session_id = ?
+    ORDER BY ts DESC, id DESC
+    LIMIT ?
+'''
+
+USER_HISTORY_SQL = '''
+    SELECT id, timestamp, role, content
+    FROM chat_history
+    WHERE user_id = ?
+    ORDER BY ts DESC, id DESC
+    LIMIT ?
+'''
+
+# Chat rows from every request are group-committed by one background writer.
+# Started and drained by the FastAPI lifespan in main.py.
+chat_writer = WriteBehindQueue(INSERT_CHAT_SQL, name="chat_history", on_conflict=lambda rows: _renumber(rows))
+
+# Recent turns per session, kept in memory so alfred_node doesn't read back rows that were
+# just written (and may still be sitting in chat_writer's queue). Updated synchronously by save_chat.
+SESSION_CACHE_SIZE = 1024
+SESSION_CACHE_TTL = 6 * 3600
+SESSION_CACHE_ROWS = 50
+
+class SessionHistory:
+    def __init__(self, rows=(), complete: bool = False):
+        self.rows = deque(rows, maxlen=SESSION_CACHE_ROWS)
+        # True when the rows cover everything the session has (the table held fewer than SESSION_CACHE_ROWS)
+        self.complete = complete
+
+    def can_serve(self, limit: int) -> bool:
+        return self.complete or len(self.rows) >= limit
+
+_sessions = TTLCache(SESSION_CACHE_SIZE, SESSION_CACHE_TTL)
+
+# Row ids are handed out here rather than by SQLite, so a cached row has its final id
+# before chat_writer has flushed it. Seeded from the table on first use. An id is taken
+# inside chat_writer.put_ordered, right as its row is queued, so rows commit in id order
+# and /history?since_id never skips a lower id that was still waiting for queue space.
+_chat_ids = None
+
+async def _seed_chat_ids():
+    global _chat_ids
+    if _chat_ids is None:
+        row = await db.afetchone(MAX_CHAT_ID_SQL)
+        if _chat_ids is None:
+            _chat_ids = itertools.count(row["id"] + 1)
+
+async def _renumber(rows: list) -> list:
+    """
+    chat_writer's on_conflict: another writer (e.g. a second worker process) already used these ids.
+    Move the counter past MAX(id) and give each row, and its cached copy, a fresh id. chat_writer
+    queues the rows again behind everything pending, so they still commit in id order.
+    """
+    global _chat_ids
+    row = await db.afetchone(MAX_CHAT_ID_SQL)
+    _chat_ids = itertools.count(max(next(_chat_ids), row["id"] + 1))
+    renumbered = []
+    for old_row in rows:
+        chat_id = next(_chat_ids)
+        session = _sessions.get((old_row[5], old_row[6]))
+        for cached in (session.rows if session is not None else ()):
+            if cached["id"] == old_row[0]:
+                cached["id"] = chat_id
+                break
+        renumbered.append((chat_id, *old_row[1:]))
+    metrics.incr("chat_history.renumbered", len(rows))
+    print(f"[ERROR] {len(rows)} chat ids were taken by another writer; renumbered from {renumbered[0][0]}")
+    return renumbered
+
 async def save_chat(role: str, content: str, user_id: str, session_id: str):
     if DEBUG:
         start = time.perf_counter()
         print("ALFRED USING SAVE CHAT TOOL")
 
-    timestamp = datetime.now().isoformat()
-
-    def db_write():
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
-            INSERT INTO chat_history (
-                timestamp, role, content, user_id, session_id
-            ) VALUES (?, ?, ?, ?, ?)
-        ''', (
-            timestamp,
-            role,
-            content,
-            user_id,
-            session_id,
-        ))
-        conn.commit()
-        conn.close()
-
-    # Run blocking DB write in default executor to avoid blocking event loop
-    loop = asyncio.get_event_loop()
-    await loop.run_in_executor(None, db_write)
+    now = datetime.now()
+    timestamp = now.isoformat()
+    await _seed_chat_ids()
+
+    def make_row():
+        chat_id = next(_chat_ids)
+        key = (user_id, session_id)
+        session = _sessions.get(key)
+        if session is None:
+            session = SessionHistory()
+            _sessions.set(key, session)
+        session.rows.append({"id": chat_id, "timestamp": timestamp, "role": role, "content": content})
+        return (chat_id, timestamp, db.to_ms(now), role, content, user_id, session_id)
+
+    await chat_writer.put_ordered(make_row)
 
     if DEBUG:
          duration = time.perf_counter() - start
@@ -47,7 +140,7 @@ async def save_chat(role: str, content: str, user_id: str, session_id: str):
         "session_id": session_id,
     }
 
-def load_chat_history(user_id: str, session_id: str = None, limit: int = 6) -> list:
+async def load_chat_history(user_id: str, session_id: str = None, limit: int = 6) -> list:
     """
     Use this tool to load the chat history, mainly here to build the chat window back up on new browser load.
     """
@@ -55,37 +148,72 @@ def load_chat_history(user_id: str, session_id: str = None, limit: int = 6) -> l
             start = time.perf_counter()
             print("ALFRED USING LOAD CHAT HISTORY TOOL")
 
-    conn = get_db_connection()
-    cursor = conn.cursor()
-
-    if session_id:
-        cursor.execute('''
-            SELECT timestamp, role, content
-            FROM chat_history
-            WHERE user_id = ? AND session_id = ?
-            ORDER BY timestamp DESC
-            LIMIT ?
-        ''', (user_id, session_id, limit))
+    if session_id and limit <= SESSION_CACHE_ROWS:
+        history = await _load_session(user_id, session_id, limit)
     else:
-        cursor.execute('''
-            SELECT timestamp, role, content
-            FROM chat_history
-            WHERE user_id = ?
-            ORDER BY timestamp DESC
-            LIMIT ?
-        ''', (user_id, limit))
-
-    rows = cursor.fetchall()
-    conn.close()
+        if session_id:
+            rows = await db.afetchall(SESSION_HISTORY_SQL, (user_id, session_id, limit))
+        else:
+            rows = await db.afetchall(USER_HISTORY_SQL, (user_id, limit))
+        history = [
+            {
+                "id": row["id"],
+                "timestamp": row["timestamp"],
+                "role": row["role"],
+                "content": row["content"]
+            } for row in reversed(rows)
+        ]
 
     if DEBUG:
          duration = time.perf_counter() - start
          print(f"[DEBUG] load_chat_history took {duration:.2f}s\n")
 
-    return [
-        {
-            "timestamp": row["timestamp"],
-            "role": row["role"],
-            "content": row["content"]
-        } for row in reversed(rows)
-    ]
+    return history
+
+async def _load_session(user_id: str, session_id: str, limit: int) -> list:
+    key = (user_id, session_id)
+    session = _sessions.get(key)
+    if session is not None and session.can_serve(limit):
+        metrics.incr("chat_history.hit")
+    else:
+        metrics.incr("chat_history.miss")
+        rows = await db.afetchall(SESSION_HISTORY_SQL, (user_id, session_id, SESSION_CACHE_ROWS))
+        merged = {row["id"]: dict(row) for row in rows}
+        # Rows saved while the session was cold may not be flushed yet; keep them
+        for row in (session.rows if session is not None else ()):
+            merged.setdefault(row["id"], row)
+        session = SessionHistory(
+            (merged[chat_id] for chat_id in sorted(merged)),
+            complete=len(rows) < SESSION_CACHE_ROWS,
+        )
+        _sessions.set(key, session)
+    return [dict(row) for row in list(session.rows)[-limit:]] if limit > 0 else []
+
+
+def _scope(user_id: str, session_id: str = None) -> tuple:
+    if session_id:
+        return "user_id = ? AND session_id = ?", (user_id, session_id)
+    return "user_id = ?", (user_id,)
+
+async def latest_chat_id(user_id: str, session_id: str = None) -> int:
+    scope, params = _scope(user_id, session_id)
+    row = await db.afetchone(LATEST_ID_SQL.format(scope=scope), params)
+    return row["id"]
+
+async def history_page(user_id: str, session_id: str = None, before_id: int = None,
+                       since_id: int = None, limit: int = 50) -> tuple:
+    """
+    One page of chat history, oldest first, and whether more rows lie beyond it.
+    since_id pages forward (rows newer than since_id); otherwise pages backward from before_id (or the newest row).
+    """
+    scope, params = _scope(user_id, session_id)
+    if since_id is not None:
+        rows = await db.afetchall(PAGE_SINCE_SQL.format(scope=scope), (*params, since_id, limit + 1))
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+    else:
+        before = before_id if before_id is not None else 2 ** 63 - 1
+        rows = await db.afetchall(PAGE_BEFORE_SQL.format(scope=scope), (*params, before, limit + 1))
+        has_more = len(rows) > limit
+        rows = list(reversed(rows[:limit]))
+    return [dict(row) for row in rows], has_more
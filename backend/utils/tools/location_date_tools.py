@@ -1,34 +1,76 @@
 # alfred/backend/utils/tools/location_date_tools.py
 
 from datetime import datetime
-import parsedatetime
-import requests
+from utils import db, metrics, date_parser
+from utils.cache import TTLCache, SingleFlight
+from utils.http import get_client
 import os
 import time
 
 DEBUG = True
 
+GEOCODE_URL = "https://api.opencagedata.com/geocode/v1/json"
+GEOCODE_TTL = int(os.getenv("GEOCODE_CACHE_TTL") or 30 * 24 * 3600)
+GEOCODE_MISS_TTL = 3600
+
+GEOCODE_LOOKUP_SQL = "SELECT lat, lon FROM geocode_cache WHERE query_key = ? AND created_ts >= ?"
+GEOCODE_UPSERT_SQL = '''
+    INSERT INTO geocode_cache (query_key, lat, lon, created_ts) VALUES (?, ?, ?, ?)
+    ON CONFLICT (query_key) DO UPDATE SET lat = excluded.lat, lon = excluded.lon, created_ts = excluded.created_ts
+'''
+
+# Places rarely move: an in-memory LRU in front of the geocode_cache table
+_geocode_cache = TTLCache(1024, GEOCODE_TTL)
+_geocode_in_flight = SingleFlight()
+
 def get_current_date(query: str) -> str:
     """
     Use this tool when you need the current date and/or time to complete a task.
     """
     if DEBUG:
         print(f"ALFRED USING GET CURRENT TIME TOOL")
-    return datetime.now().strftime("%Y-%m-%d %H:%M")
+    return date_parser.now().strftime("%Y-%m-%d %H:%M")
 
-def get_lat_lon(city: str):
+def _geocode_key(city: str) -> str:
+    return " ".join(city.lower().split())
+
+async def get_lat_lon(city: str):
     """
     Use this tool to turn a location into a lat/lon
     """
     if DEBUG:
         start = time.perf_counter()
     print(f"WEATHER AGENT USING GET LAT LON TOOL FOR {city}")
-    url = f"https://api.opencagedata.com/geocode/v1/json?q={city}&key={os.getenv('GEOCODE_API')}"
-    response = requests.get(url)
-    data = response.json()
-    if data['results']:
+    key = _geocode_key(city)
+
+    cached = _geocode_cache.get(key)
+    if cached is not None:
+        metrics.incr("geocode.hit")
+        return cached
+
+    row = await db.afetchone(GEOCODE_LOOKUP_SQL, (key, db.now_ms() - GEOCODE_TTL * 1000))
+    if row is not None:
+        metrics.incr("geocode.hit")
+        _geocode_cache.set(key, (row["lat"], row["lon"]))
+        return row["lat"], row["lon"]
+
+    metrics.incr("geocode.coalesced" if _geocode_in_flight.in_flight(key) else "geocode.miss")
+    api_key = os.getenv('GEOCODE_API_KEY') or os.getenv('GEOCODE_API')
+
+    async def call_api():
+        response = await get_client().get(GEOCODE_URL, params={"q": city, "key": api_key})
+        # A bad key, used-up quota or rate limit (401/402/429) also comes back with no results;
+        # raise instead so it isn't remembered as an unknown place
+        response.raise_for_status()
+        return response.json()
+
+    # Concurrent weather calls for the same new place share one lookup
+    data = await _geocode_in_flight.do(key, call_api)
+    if data.get('results'):
         lat = data['results'][0]['geometry']['lat']
         lon = data['results'][0]['geometry']['lng']
+        _geocode_cache.set(key, (lat, lon))
+        await db.aexecute(GEOCODE_UPSERT_SQL, (key, lat, lon, db.now_ms()))
         if DEBUG:
             print(f"Lat Lon Raw Data: {data}")
             print(f"LAT LON: {lat},{lon}")
@@ -36,16 +78,24 @@ def get_lat_lon(city: str):
             print(f"[DEBUG] get_lat_lon took: {duration:.2f}s")
         return lat, lon
     else:
+        # Only reached on a 200 with zero results: remember unknown places briefly so a typo doesn't hit the API on every retry
+        _geocode_cache.set(key, (None, None), ttl=GEOCODE_MISS_TTL)
         return None, None
-    
+
+async def preload_default_location():
+    """Resolve LOCATION at startup so the common weather call never geocodes over the network."""
+    location = os.getenv("LOCATION")
+    if not location:
+        return
+    try:
+        await get_lat_lon(location)
+    except Exception as e:
+        print(f"[ERROR] Could not preload default location {location}: {e}")
+
 def parse_date(text):
     """
     Use this to parse natural language dates.
     """
     if DEBUG:
         print(f"[DEBUG] parse_date text input: {text}")
-    cal = parsedatetime.Calendar()
-    time_struct, parse_status = cal.parse(text)
-    if parse_status == 0:
-        raise ValueError("Could not parse date")
-    return datetime(*time_struct[:6])
\ No newline at end of file
+    return date_parser.parse(text)
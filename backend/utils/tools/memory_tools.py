@@ -2,83 +2,175 @@
 
 import os
 import json
+import re
 import time
-from utils.db import get_db_connection
+import asyncio
+from utils import db, embeddings, memory_dedup, metrics, minhash, models, vector_index
+from utils.context import estimate_tokens
+from utils.inference import ollama_queue, TOOL
 from datetime import datetime
-from zoneinfo import ZoneInfo
-from langchain_ollama import ChatOllama
 from langchain_core.tools import tool
 
-model = os.getenv('OLLAMA_MODEL')
+llm = models.ollama(temperature=0.3)
+
+# get_context returns retrieved memories directly unless they would take more tokens than this
+CONTEXT_TOKEN_BUDGET = int(os.getenv("MEMORY_CONTEXT_TOKENS") or 400)
 
 DEBUG = True
 
-@tool
-def load_longterm_memory(user_id: str) -> list:
-    """
-    Use this to find longterm memory or information about the user to help respond to the request.
-    """
-    if DEBUG:
-            start = time.perf_counter()
-            print(f"LOADING LONGTERM MEMORIES FOR {user_id}")
+LOAD_MEMORIES_SQL = '''
+    SELECT timestamp, content, summary, tags
+    FROM longterm_memory
+    WHERE user_id = ?
+    ORDER BY ts DESC
+'''
 
-    conn = get_db_connection()
-    cursor = conn.cursor()
+RECENT_MEMORIES_SQL = '''
+    SELECT id, timestamp, content, summary, tags
+    FROM longterm_memory
+    WHERE user_id = ?
+    ORDER BY ts DESC
+    LIMIT ?
+'''
 
-    cursor.execute('''
-        SELECT timestamp, content, summary, tags
-        FROM longterm_memory
-        WHERE user_id = ?
-        ORDER BY timestamp DESC
-    ''', (user_id,))
+# bm25 column weights: content, summary, tags
+SEARCH_MEMORIES_SQL = '''
+    SELECT m.id, m.timestamp, m.content, m.summary, m.tags,
+           bm25(longterm_memory_fts, 1.0, 2.0, 2.0) AS rank
+    FROM longterm_memory_fts
+    JOIN longterm_memory m ON m.id = longterm_memory_fts.rowid
+    WHERE longterm_memory_fts MATCH ? AND m.user_id = ?
+    ORDER BY rank
+    LIMIT ?
+'''
 
-    rows = cursor.fetchall()
-    conn.close()
-    if DEBUG:
-         duration = time.perf_counter() - start
-         print(f"[DEBUG] load_longterm_memory took {duration:.2f}s")
+SEARCH_STOPWORDS = frozenset("""
+    a an and are about as at be did do does for from have how i in is it me my of on or
+    tell that the this to was what whats when where which who why with you your
+""".split())
+
+MEMORIES_BY_ID_SQL = '''
+    SELECT id, timestamp, content, summary, tags
+    FROM longterm_memory
+    WHERE user_id = ? AND id IN ({placeholders})
+'''
+
+INSERT_MEMORY_SQL = '''
+    INSERT INTO longterm_memory (timestamp, ts, user_id, content, summary, tags, embedding, embedding_model)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+# Saving a near-duplicate of an existing memory rewrites that row instead of adding one
+MERGE_MEMORY_SQL = '''
+    UPDATE longterm_memory
+    SET timestamp = ?, ts = ?, content = ?, summary = ?, tags = ?, embedding = ?, embedding_model = ?
+    WHERE id = ?
+'''
+
+# Reciprocal rank fusion constant: a result's score is the sum of 1 / (RRF_K + rank) over the rankings it appears in
+RRF_K = 60
+
+def _rows_to_memories(rows) -> list:
     return [
         {
             "timestamp": row["timestamp"],
             "content": row["content"],
             "summary": row["summary"],
-            "tags": json.loads(row["tags"])
+            "tags": json.loads(row["tags"] or "[]")
         } for row in rows
     ]
 
-def filter_relevant_memories(memories, query):
-    keywords = set(query.lower().split())
-    filtered = []
+async def load_longterm_memory(user_id: str) -> list:
+    """
+    Use this to find longterm memory or information about the user to help respond to the request.
+    """
+    if DEBUG:
+            start = time.perf_counter()
+            print(f"LOADING LONGTERM MEMORIES FOR {user_id}")
 
-    for mem in memories:
-        combined = f"{mem.get('summary', '')} {' '.join(mem.get('tags', []))}".lower()
-        if any(kw in combined for kw in keywords):
-            filtered.append(mem)
+    rows = await db.afetchall(LOAD_MEMORIES_SQL, (user_id,))
+    if DEBUG:
+         duration = time.perf_counter() - start
+         print(f"[DEBUG] load_longterm_memory took {duration:.2f}s")
+    return _rows_to_memories(rows)
 
-    return filtered or memories[:3]  # Fallback: don't return nothing
+def build_match_query(query: str) -> str | None:
+    """FTS5 MATCH expression matching any of the query's meaningful words."""
+    words = [w for w in re.findall(r"\w+", query.lower()) if len(w) > 1 and w not in SEARCH_STOPWORDS]
+    if not words:
+        return None
+    return " OR ".join(f'"{w}"' for w in dict.fromkeys(words))
+
+async def _keyword_search(user_id: str, query: str, k: int) -> list:
+    match = build_match_query(query)
+    return await db.afetchall(SEARCH_MEMORIES_SQL, (match, user_id, k)) if match else []
+
+async def search_longterm_memory(user_id: str, query: str, k: int = 5) -> list:
+    """
+    Top-k memories for the query. BM25 keyword matches and embedding nearest neighbours
+    are merged with reciprocal rank fusion, so paraphrases are found as well as exact words.
+    Falls back to the most recent memories when nothing matches.
+    """
+    keyword_rows, semantic = await asyncio.gather(
+        _keyword_search(user_id, query, k),
+        vector_index.search(user_id, query, k),
+    )
+
+    scores = {}
+    for ranking in ([row["id"] for row in keyword_rows], [memory_id for memory_id, _ in semantic]):
+        for rank, memory_id in enumerate(ranking):
+            scores[memory_id] = scores.get(memory_id, 0.0) + 1.0 / (RRF_K + rank + 1)
+    best = sorted(scores, key=scores.get, reverse=True)[:k]
+
+    rows_by_id = {row["id"]: row for row in keyword_rows}
+    missing = [memory_id for memory_id in best if memory_id not in rows_by_id]
+    if missing:
+        sql = MEMORIES_BY_ID_SQL.format(placeholders=", ".join("?" * len(missing)))
+        for row in await db.afetchall(sql, (user_id, *missing)):
+            rows_by_id[row["id"]] = row
+    rows = [rows_by_id[memory_id] for memory_id in best if memory_id in rows_by_id]
+
+    if not rows:
+        rows = await db.afetchall(RECENT_MEMORIES_SQL, (user_id, min(k, 3)))
+    return _rows_to_memories(rows)
+
+def format_memories(memories: list) -> str:
+    lines = []
+    for memory in memories:
+        line = f"- ({memory['timestamp'][:10]}) {memory['content']}"
+        if memory["summary"] and memory["summary"] != memory["content"]:
+            line += f" | summary: {memory['summary']}"
+        if memory["tags"]:
+            line += f" | tags: {', '.join(memory['tags'])}"
+        lines.append(line)
+    return "Relevant long-term memories (most relevant first):\n" + "\n".join(lines)
 
 @tool
-def get_context(query: str, user_id: str) -> str:
+async def get_context(query: str, user_id: str) -> str:
         """
         Use this tool to retrieve relevant context from long-term memory for the given user.
-        LLaMA3 will search and decide what is relevant from all stored entries.
+        The best matching entries are found with full-text and embedding search and returned as-is;
+        LLaMA3 only condenses them when they are too long to pass along.
         """
 
         if DEBUG:
             start = time.perf_counter()
             print(f"MEMORY AGENT IS USING GET CONTEXT TOOL")
 
-        llm = ChatOllama(
-        model=model,
-        temperature=0.3
-        )
-
-        memories = load_longterm_memory(user_id)
-        if not memories:
+        relevant_memories = await search_longterm_memory(user_id, query)
+        if not relevant_memories:
             return "No long-term memories found."
-        
-        relevant_memories = filter_relevant_memories(memories, query)
 
+        # alfred_node answers from the tool output, so a short result needs no extra LLM round trip
+        context = format_memories(relevant_memories)
+        if estimate_tokens(context) <= CONTEXT_TOKEN_BUDGET:
+            metrics.incr("get_context.direct")
+            if DEBUG:
+                duration = time.perf_counter() - start
+                print(f"[DEBUG] get_context took {duration:.2f}s (direct)")
+            return context
+
+        metrics.incr("get_context.summarized")
         prompt = f"""
         You are an expert in retrieving relevant memories from a database. The user has asked: "{query}"
 
@@ -89,15 +181,79 @@ def get_context(query: str, user_id: str) -> str:
         Return as plain text — NOT JSON.
         """
         print(f"LLAMA PROMPT: {prompt}")
-        response = llm.invoke(prompt)
+        response = await ollama_queue.run(TOOL, llm.ainvoke, prompt)
         if DEBUG:
              print(f"LLAMA RESPONSE: {response.content.strip()}")
              duration = time.perf_counter() - start
              print(f"[DEBUG] get_context took {duration:.2f}s")
         return response.content.strip()
 
+def _find_pending(writes: list, user_id: str, words: frozenset, existing_id):
+    for write in writes:
+        if write["user_id"] != user_id:
+            continue
+        if (existing_id is not None and write["id"] == existing_id) \
+                or minhash.jaccard(words, write["words"]) >= memory_dedup.DUPLICATE_SIMILARITY:
+            return write
+    return None
+
+def _write_memories(writes: list, timestamp: str, ts: int, embedding_model: str, blobs: list):
+    with db.transaction() as conn:
+        for write, blob in zip(writes, blobs):
+            values = (write["content"], write["summary"], json.dumps(write["tags"]), blob, embedding_model)
+            if write["id"] is None:
+                write["id"] = conn.execute(INSERT_MEMORY_SQL, (timestamp, ts, write["user_id"], *values)).lastrowid
+            else:
+                conn.execute(MERGE_MEMORY_SQL, (timestamp, ts, *values, write["id"]))
+            memory_dedup.index_memory(conn, write["user_id"], write["id"], write["signature"])
+
+async def insert_memories(memories: list, cls: str = TOOL) -> list:
+    """
+    Save (user_id, content, summary, tags) rows: one embedding call (in ollama_queue class cls), one transaction.
+    A memory that nearly repeats an existing one, or an earlier one in the same call, is merged
+    into it instead (newer wording, tags unioned). Returns the id each memory ended up in, in order.
+    """
+    if not memories:
+        return []
+    writes, targets = [], []
+    for user_id, content, summary, tags in memories:
+        words = minhash.tokens(content, summary)
+        sig = minhash.signature(words)
+        write = _find_pending(writes, user_id, words, None)
+        if write is None:
+            duplicate = await memory_dedup.find_duplicate(user_id, words, sig)
+            if duplicate is not None:
+                # two memories in one call can match the same stored row
+                write = _find_pending(writes, user_id, words, duplicate["id"])
+            if write is None:
+                write = {"id": None, "user_id": user_id, "tags": [], "merged": False}
+                if duplicate is not None:
+                    write.update(id=duplicate["id"], tags=json.loads(duplicate["tags"] or "[]"), merged=True)
+                writes.append(write)
+        if write["merged"] or any(target is write for target in targets):
+            metrics.incr("memory_dedup.merged")
+        write.update(content=content, summary=summary, words=words, signature=sig,
+                     tags=memory_dedup.merge_tags(write["tags"], tags))
+        targets.append(write)
+
+    now = datetime.now()
+    texts = [vector_index.memory_text(write["content"], write["summary"], write["tags"]) for write in writes]
+    embedding_model, vectors = await embeddings.embed(texts, cls)
+    blobs = [embeddings.to_blob(vector) for vector in vectors]
+    await db.run(_write_memories, writes, now.isoformat(), db.to_ms(now), embedding_model, blobs)
+
+    for write, blob in zip(writes, blobs):
+        if write["merged"]:
+            vector_index.invalidate(write["user_id"])
+        else:
+            vector_index.add(write["user_id"], write["id"], embedding_model, blob)
+    return [write["id"] for write in targets]
+
+async def insert_memory(user_id: str, content: str, summary: str, tags: list) -> int:
+    return (await insert_memories([(user_id, content, summary, tags)]))[0]
+
 @tool
-def save_longterm_memory(user_id: str, content: str, summary: str, tags: list):
+async def save_longterm_memory(user_id: str, content: str, summary: str, tags: list):
 
     """
     Use this to save longterm memories into the database.
@@ -106,22 +262,7 @@ def save_longterm_memory(user_id: str, content: str, summary: str, tags: list):
         start = time.perf_counter()
         print(f"ALFRED USING SAVE LONGTERM MEMORY TOOL")
 
-    conn = get_db_connection()
-    cursor = conn.cursor()
-
-    cursor.execute('''
-        INSERT INTO longterm_memory (timestamp, user_id, content, summary, tags)
-        VALUES (?, ?, ?, ?, ?)
-    ''', (
-        datetime.now().isoformat(),
-        user_id,
-        content,
-        summary,
-        json.dumps(tags)
-    ))
-
-    conn.commit()
-    conn.close()
+    await insert_memory(user_id, content, summary, tags)
 
     if DEBUG:
         duration = time.perf_counter() - start
@@ -129,102 +270,3 @@ def save_longterm_memory(user_id: str, content: str, summary: str, tags: list):
         print("Memory saved successfully")
 
     return "Memory saved successfully"
-
-@tool
-async def check_for_longterm_storage(content: str, user_id: str):
-        """Decide if a message should be stored in long-term memory"""
-
-        examples = [
-            {
-                "message": "My cat's name is Memphis and he takes his medication every night at 7pm.",
-                "response": {
-                    "save": True,
-                    "summary": "User's cat Memphis takes medication at 7pm",
-                    "tags": ["cat", "medication", "schedule"]
-                }
-            },
-            {
-                "message": "This should be saved to longterm memory, my house was built in 2017.",
-                "response": {
-                    "save": True,
-                    "summary": "User\'s house was built in 2017",
-                    "tags": ['house', 'built']
-                }
-            },
-            {
-                "message": "Can you remember when I was a kid I had a dog named Jocko?",
-                "response": {
-                    "save": True,
-                    "summary": "User once had a dog named Jocko.",
-                    "tags": ['dog', 'past-pet', 'childhood']
-                }
-            },
-            {
-                "message": "What's the weather like today?",
-                "response": {
-                    "save": False,
-                    "summary": "",
-                    "tags": []
-                }
-            },
-            {
-                "message": "My birthday is September 10th.",
-                "response": {
-                    "save": True,
-                    "summary": "User's birthday is July 3rd",
-                    "tags": ["birthday", "personal_info"]
-                }
-            },
-            {
-                "message": "Turn off the lights in the living room.",
-                "response": {
-                    "save": False,
-                    "summary": "",
-                    "tags": []
-                }
-            },{
-                "message": "Add a task to clean the bathroom every Friday",
-                "response": {
-                    "save": True,
-                    "summary": "",
-                    "tags": []
-                }
-            },
-
-        ]
-        llm = ChatOllama(
-        model=model,
-        temperature=0.3
-        )
-
-        example_text = "\n".join([
-            f'Message: "{ex["message"]}"\nResponse: {json.dumps(ex["response"])}'
-            for ex in examples
-        ])
-            
-        check_prompt = f"""
-            You are a memory classification assistant. Determine whether the following message should be stored in long-term memory, 
-            tasks, or ignored.
-            Respond in JSON format: {{ "save": true/false, "summary": "...", "tags": [] }}
-
-            {example_text}
-
-            Message: "{content}"
-            Response:
-            """
-
-        decision = llm.invoke(check_prompt)
-        try:
-            parsed = json.loads(decision.content)
-            if DEBUG:
-                 print(f'LONGTERM MEMORY DECISION: {parsed}')
-            if parsed.get("save"):
-                save_longterm_memory({
-                    "timestamp": datetime.now(ZoneInfo("America/Denver")).isoformat(),
-                    "user_id": user_id,
-                    "content": content,
-                    "summary": parsed.get("summary", ""),
-                    "tags": parsed.get("tags", [])
-                })
-        except Exception as e:
-            print(f"Error in long-term memory decision: {e}")
\ No newline at end of file
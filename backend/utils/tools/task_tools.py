@@ -1,28 +1,49 @@
 # alfred/backend/utils/tools/task_tools.py
 
 import json
-from utils.db import get_db_connection
-from langchain_ollama import ChatOllama
+from utils import db, metrics, models, task_cache, task_matcher
+from utils.scheduler import reminders, next_occurrence, check_recurrence
+from utils.inference import ollama_queue, TOOL
 from langchain_core.tools import tool
 from datetime import datetime
-import sqlite3
-import os
 import time
 from .location_date_tools import parse_date
 import traceback
 
 DEBUG = True
 
-model = os.getenv('OLLAMA_MODEL')
+INSERT_TASK_SQL = '''
+    INSERT INTO tasks (timestamp, ts, user_id, category, task, due_date, due_ts, recurrence, notes)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
 
-llm = ChatOllama(
-    model=model,
-    temperature=0.1,
-    streaming=False
-)
+COMPLETE_TASK_SQL = 'UPDATE tasks SET completed = 1 WHERE id = ?'
+
+TASK_BY_ID_SQL = 'SELECT id, category, task, due_date, recurrence, notes FROM tasks WHERE id = ?'
+
+llm = models.ollama(temperature=0.1)
+
+async def insert_task(user_id: str, category: str, task: str, due_date: datetime, recurrence: str, notes: str) -> int:
+    """Insert a task and let the task cache and reminder scheduler know about it."""
+    now = datetime.now()
+    due_ts = db.to_ms(due_date)
+    task_id = await db.aexecute(INSERT_TASK_SQL, (
+        now.isoformat(), db.to_ms(now), user_id, category, task, due_date, due_ts, recurrence, notes
+    ))
+    task_cache.added(user_id, {
+        "id": task_id,
+        "timestamp": now.isoformat(),
+        "category": category,
+        "task": task,
+        "due_date": due_date.isoformat(" "),  # how sqlite3 stores the datetime
+        "recurrence": recurrence,
+        "completed": 0
+    }, due_ts)
+    reminders.schedule(task_id, user_id, task, due_ts)
+    return task_id
 
 @tool
-def create_new_task(user_id: str, category: str, task: str, date: str, recurrence: str = 'once', notes: str = '') -> str:
+async def create_new_task(user_id: str, category: str, task: str, date: str, recurrence: str = 'once', notes: str = '') -> str:
     """
     Use this tool when the user wants to create a household-related task.
     Format: user_id, category, task, due_date, recurrence
@@ -38,6 +59,8 @@ def create_new_task(user_id: str, category: str, task: str, date: str, recurrenc
         print(f"USER_ID: {user_id}, CATEGORY: {category}, TASK: {task}, DATE: {date}, RECURRENCE: {recurrence}")
     
     try:
+        # An unrecognised recurrence would quietly become a one-off task, so ask for a supported form instead
+        check_recurrence(recurrence)
         due_date = parse_date(date)
 
         if not due_date:
@@ -47,18 +70,7 @@ def create_new_task(user_id: str, category: str, task: str, date: str, recurrenc
         if DEBUG:
             print(f"DUE_DATE_PARSED: {due_date}")
 
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        timestamp = datetime.now().isoformat()
-
-        cursor.execute('''
-            INSERT INTO tasks (timestamp, user_id, category, task, due_date, recurrence, notes)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        ''', (timestamp, user_id, category, task, due_date, recurrence, ''))
-
-        conn.commit()
-        task_id = cursor.lastrowid
-        conn.close()
+        task_id = await insert_task(user_id, category, task, due_date, recurrence, '')
 
         if DEBUG:
             print("TASK COMPLETED SUCCESFULLY")
@@ -72,48 +84,149 @@ def create_new_task(user_id: str, category: str, task: str, date: str, recurrenc
             traceback.print_exc()
         return f"Error creating event: {str(e)}"
 
+# Completed / all tasks are not cached, so they are read with a keyset query:
+# {filters} are built in query_tasks and the trailing LIMIT fetches one extra row to detect another page.
+TASK_QUERY_SQL = '''
+    SELECT id, timestamp, category, task, due_date, due_ts, recurrence, completed
+    FROM tasks
+    WHERE {filters}
+    ORDER BY due_ts ASC, id ASC
+    LIMIT ?
+'''
+
+TASK_STATUSES = ("open", "completed", "all")
+DEFAULT_TASK_LIMIT = 20
+MAX_TASK_LIMIT = 100
+
+def encode_cursor(key: tuple) -> str | None:
+    return f"{key[0]}:{key[1]}" if key else None
+
+def decode_cursor(cursor: str) -> tuple | None:
+    if not cursor:
+        return None
+    # The cursor comes back from the model, so don't trust its shape
+    try:
+        due_ts, task_id = cursor.strip().split(":")
+        return int(due_ts), int(task_id)
+    except ValueError:
+        raise ValueError(f"invalid cursor {cursor!r}; pass next_cursor from a previous result, "
+                         "or leave it empty for the first page") from None
+
+async def fetch_tasks(user_id: str) -> list:
+    """All of the user's open tasks, ordered by due date."""
+    return (await task_cache.get(user_id)).tasks
+
+async def query_tasks(user_id: str, status: str = "open", due_from: int = None, due_to: int = None,
+                      category: str = None, limit: int = DEFAULT_TASK_LIMIT, cursor: str = None) -> tuple:
+    """
+    One page of the user's tasks: (tasks, next_cursor). Open tasks come from the task cache,
+    completed / all tasks from SQLite using the (user_id, completed|category, due_ts) indexes.
+    """
+    after = decode_cursor(cursor)
+    if status == "open":
+        tasks, last = (await task_cache.get(user_id)).query(due_from, due_to, category, limit, after)
+        return tasks, encode_cursor(last)
+
+    filters, params = ["user_id = ?"], [user_id]
+    if status == "completed":
+        filters.append("completed = 1")
+    if category:
+        filters.append("category = ?")
+        params.append(category)
+    if due_from is not None:
+        filters.append("due_ts >= ?")
+        params.append(due_from)
+    if due_to is not None:
+        filters.append("due_ts <= ?")
+        params.append(due_to)
+    if after is not None:
+        due_ts, task_id = after
+        if due_ts == -1:
+            # the previous page ended among tasks without a due date, which sort first
+            filters.append("((due_ts IS NULL AND id > ?) OR due_ts IS NOT NULL)")
+            params.append(task_id)
+        else:
+            filters.append("(due_ts > ? OR (due_ts = ? AND id > ?))")
+            params.extend((due_ts, due_ts, task_id))
+
+    rows = await db.afetchall(TASK_QUERY_SQL.format(filters=" AND ".join(filters)), (*params, limit + 1))
+    tasks = [dict(row) for row in rows[:limit]]
+    next_cursor = None
+    if len(rows) > limit:
+        next_cursor = encode_cursor(task_cache.sort_key(tasks[-1]["due_ts"], tasks[-1]["id"]))
+    for task in tasks:
+        del task["due_ts"]
+    return tasks, next_cursor
+
+def _day_bound(text: str, end: bool) -> int | None:
+    # Windows are whole days: "before friday" includes everything due on Friday
+    if not text:
+        return None
+    day = parse_date(text).replace(hour=0, minute=0, second=0, microsecond=0)
+    if end:
+        day = day.replace(hour=23, minute=59, second=59, microsecond=999999)
+    return db.to_ms(day)
+
 @tool
-def get_tasks(user_id: str) -> str:
+async def get_tasks(user_id: str, status: str = "open", due_after: str = "", due_before: str = "",
+                    category: str = "", limit: int = DEFAULT_TASK_LIMIT, cursor: str = "") -> str:
     """
-    Retrieve all tasks for a given user_id from the tasks table in the database.
+    Retrieve the user's tasks, soonest due first. By default only open tasks are returned.
+    status: 'open', 'completed' or 'all'. due_after / due_before: dates like 'today' or 'next friday' (inclusive).
+    category: only this category. limit: page size. cursor: the next_cursor from a previous call, to get the next page.
     """
 
     user_id = user_id.lower()
+    status = (status or "open").lower()
+    category = (category or "").lower()
     if DEBUG:
         start = time.perf_counter()
         print(f"TASK AGENT USING GET TASKS TOOL for {user_id}")
 
-    conn = get_db_connection()
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
+    if status not in TASK_STATUSES:
+        return f"Error retrieving tasks: status must be one of {', '.join(TASK_STATUSES)}"
+    try:
+        due_from = _day_bound(due_after, end=False)
+        due_to = _day_bound(due_before, end=True)
+        after = decode_cursor(cursor)
+    except ValueError as e:
+        return f"Error retrieving tasks: {str(e)}"
+    limit = max(1, min(int(limit or DEFAULT_TASK_LIMIT), MAX_TASK_LIMIT))
 
-    query = '''
-        SELECT id, timestamp, category, task, due_date, recurrence, completed
-        FROM tasks
-        WHERE user_id = ?
-        ORDER BY due_date ASC
-    '''
-    
-    cursor.execute(query, (user_id,))
-    rows = cursor.fetchall()
-    conn.close()
+    if status == "open":
+        # Open-task pages are memoized on the cached view until the list changes
+        view = await task_cache.get(user_id)
+        def build():
+            tasks, last = view.query(due_from, due_to, category, limit, after)
+            return json.dumps({"tasks": tasks, "next_cursor": encode_cursor(last)})
+        serialized = view.serialized((due_from, due_to, category, limit, after), build)
+    else:
+        tasks, next_cursor = await query_tasks(user_id, status, due_from, due_to, category, limit, cursor)
+        serialized = json.dumps({"tasks": tasks, "next_cursor": next_cursor})
 
     if DEBUG:
         duration = time.perf_counter() - start
-        print(f"[DEBUG] get_tasks took {duration:.2f}s")
-        
-    print(f"{json.dumps([dict(row) for row in rows])}")
-    return json.dumps([dict(row) for row in rows])
+        print(f"[DEBUG] get_tasks took {duration:.2f}s ({status}, {len(serialized)} chars)")
+    return serialized
 
-@tool
-def find_matching_task(user_id: str, query: str) -> int | None:
+async def find_matching_task(user_id: str, query: str) -> int | None:
     """
-    Use this tool to find matching tasks in task table.
+    Find the open task the query refers to. Clear matches are resolved locally by
+    task_matcher; only close calls go to the LLM, and then only with the few closest tasks.
     """
     if DEBUG:
         print(f"TASK AGENT USING FIND MATCHING TASK")
         start = time.perf_counter()
-    task_list = get_tasks(user_id)
+    task_list = await fetch_tasks(user_id)
+    task_id, candidates = task_matcher.match(query, task_list)
+    if task_id is not None:
+        metrics.incr("task_match.local")
+        return task_id
+    if not candidates:
+        metrics.incr("task_match.none")
+        return None
+
+    metrics.incr("task_match.llm")
     prompt = f"""
         You are a helpful assistant. Match the user's query to the most relevant task in their list.
         Return ONLY the ID of the best-matching task — just the integer and nothing else.
@@ -123,24 +236,26 @@ def find_matching_task(user_id: str, query: str) -> int | None:
         "{query}"
 
         User's tasks:
-        {json.dumps(task_list, indent=2)}
+        {json.dumps(candidates, indent=2)}
 
         Your response:
         """
 
-    response = llm.invoke(prompt).content.strip()
+    response = (await ollama_queue.run(TOOL, llm.ainvoke, prompt)).content.strip()
     if DEBUG:
         duration = time.perf_counter() - start
         print(f"[DEBUG] find_matching_task took {duration:.2f}s")
     try:
         if response.lower() == "none":
             return None
-        return int(response)
+        task_id = int(response)
     except ValueError:
         return None
+    # Only accept an id that was actually offered
+    return task_id if any(task["id"] == task_id for task in candidates) else None
 
 @tool
-def mark_task_completed(user_id, query) -> str:
+async def mark_task_completed(user_id: str, query: str) -> str:
     """
     Use this tool to mark tasks as complete in the 'task' table in the database.
     """
@@ -148,18 +263,27 @@ def mark_task_completed(user_id, query) -> str:
         print("TASK AGENT USING MARK TASK COMPLETED TOOL")
         start = time.perf_counter()
 
-    task_id = find_matching_task(user_id, query)
+    task_id = await find_matching_task(user_id, query)
     if not task_id:
         print("NO MATCHING TASK FOUND")
         return "No Matching Task Found."
 
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('UPDATE tasks SET completed = 1 WHERE id = ?', (task_id,))
-    conn.commit()
-    conn.close()
+    user_id = user_id.lower()
+    await db.aexecute(COMPLETE_TASK_SQL, (task_id,))
+    task_cache.completed(user_id, task_id)
+    reminders.cancel(task_id)
+    result = f"Task {task_id} marked as completed"
+
+    # Recurring tasks only ever have their next occurrence stored; completing one creates the next
+    row = await db.afetchone(TASK_BY_ID_SQL, (task_id,))
+    if row and row["due_date"]:
+        due = datetime.fromisoformat(row["due_date"])
+        next_due = next_occurrence(due, row["recurrence"], after=datetime.now(due.tzinfo))
+        if next_due:
+            next_id = await insert_task(user_id, row["category"], row["task"], next_due, row["recurrence"], row["notes"] or '')
+            result += f". Next occurrence (ID {next_id}) is due {next_due:%A, %B %d at %H:%M}"
 
     if DEBUG:
         duration = time.perf_counter() - start
         print(f"[DEBUG] mark_task_completed took {duration:.2f}s")
-    return f"Task {task_id} marked as completed"
\ No newline at end of file
+    return result
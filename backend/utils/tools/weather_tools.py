@@ -2,7 +2,9 @@
 
 from .location_date_tools import get_lat_lon
 from datetime import datetime
-import requests
+from utils.http import get_client
+from utils import metrics
+from utils.cache import TTLCache, SingleFlight
 import os
 import time
 from langchain_core.tools import tool
@@ -11,8 +13,57 @@ default_location = os.getenv('LOCATION')
 
 DEBUG = True
 
+CURRENT_URL = "http://api.openweathermap.org/data/2.5/weather"
+FORECAST_URL = "http://api.openweathermap.org/data/2.5/forecast"
+# Seconds a response stays fresh; forecasts only update every few hours
+CACHE_TTL = {
+    CURRENT_URL: int(os.getenv("WEATHER_CURRENT_TTL") or 600),
+    FORECAST_URL: int(os.getenv("WEATHER_FORECAST_TTL") or 3600),
+}
+
+_weather_cache = TTLCache(512, max(CACHE_TTL.values()))
+_in_flight = SingleFlight()
+
+async def fetch_weather(url: str, lat: float, lon: float) -> dict:
+    """
+    OpenWeatherMap response for a point, cached per endpoint and ~1km grid cell.
+    Concurrent requests for the same cell share one API call.
+    """
+    # Rounding to 2 decimals puts nearby lookups for the same city in the same cell
+    key = (url, round(lat, 2), round(lon, 2))
+    data = _weather_cache.get(key)
+    if data is not None:
+        metrics.incr("weather.hit")
+        return data
+    if _in_flight.in_flight(key):
+        metrics.incr("weather.coalesced")
+    else:
+        metrics.incr("weather.miss")
+
+    async def call_api():
+        params = {
+            'lat': key[1],
+            'lon': key[2],
+            'appid': os.getenv("WEATHER_API_KEY"),
+            'units': 'imperial',
+            'lang': 'en'
+        }
+        if DEBUG:
+            start_weather = time.perf_counter()
+        response = await get_client().get(url, params=params)
+        if DEBUG:
+            duration_weather = time.perf_counter() - start_weather
+            print(f"[DEBUG] weather_API took {duration_weather:.2f}s")
+            print(f'WEATHER API RESPONSE: {response}')
+        response.raise_for_status()
+        data = response.json()
+        _weather_cache.set(key, data, ttl=CACHE_TTL[url])
+        return data
+
+    return await _in_flight.do(key, call_api)
+
 @tool
-def get_current_weather(location: str = None):
+async def get_current_weather(location: str = None):
     """
     Use this tool to get the current weather for a location.
     """
@@ -24,26 +75,11 @@ def get_current_weather(location: str = None):
         location = default_location
     print(f"LOCATION: {location}")
 
-    lat, lon = get_lat_lon(location)
+    lat, lon = await get_lat_lon(location)
 
     if lat is None or lon is None:
         return f"Sorry, I couldn't find the weather for {location}."
-    params = {
-        'lat': lat,
-        'lon': lon,
-        'appid': os.getenv("WEATHER_API_KEY"),
-        'units': 'imperial',
-        'lang': 'en'
-    }
-    url = "http://api.openweathermap.org/data/2.5/weather"
-    if DEBUG:
-        start_weather = time.perf_counter()
-    response = requests.get(url, params=params)
-    if DEBUG:
-        duration_weather = time.perf_counter() - start_weather
-        print(f"[DEBUG] weather_API took {duration_weather:.2f}s")
-        print(f'WEATHER API RESPONSE: {response}')
-    data = response.json()
+    data = await fetch_weather(CURRENT_URL, lat, lon)
     desc = data['weather'][0]['description']
     temp = int(data['main']['temp'])
     humidity = data['main']['humidity']
@@ -57,7 +93,7 @@ def get_current_weather(location: str = None):
     return f"{city_name} | {desc} | {temp}F | Humidity: {humidity}%"
 
 @tool
-def get_forecast_weather(location: str = None):
+async def get_forecast_weather(location: str = None):
     """
     Use this tool to get the forecast weather for a location.
     """
@@ -70,19 +106,10 @@ def get_forecast_weather(location: str = None):
         location = default_location
     print(f"LOCATION: {location}")
 
-    lat, lon = get_lat_lon(location)
+    lat, lon = await get_lat_lon(location)
     if lat is None or lon is None:
         return f"Sorry, I couldn't find the weather for {location}."
-    params = {
-        'lat': lat,
-        'lon': lon,
-        'appid': os.getenv("WEATHER_API_KEY"),
-        'units': 'imperial',
-        'lang': 'en'
-    }
-    url = "http://api.openweathermap.org/data/2.5/forecast"
-    response = requests.get(url, params=params)
-    data = response.json()
+    data = await fetch_weather(FORECAST_URL, lat, lon)
 
     daily = {}
     for entry in data['list']:
@@ -0,0 +1,182 @@
+# alfred/backend/utils/vector_index.py
+
+# In-memory vector index over longterm_memory for semantic recall ("my pet" -> "cat Memphis").
+# Each user's vectors live in one contiguous float32 matrix, so a search is a single
+# matrix-vector product followed by a partial sort. Vectors are persisted as BLOBs on the
+# longterm_memory row; a user's matrix is built from them the first time they are searched.
+# Rows missing a vector (or embedded by another model) are embedded and saved in the background.
+
+import asyncio
+import os
+import json
+import time
+
+import numpy as np
+
+from utils import db, embeddings, metrics
+from utils.cache import TTLCache, SingleFlight
+from utils.inference import BACKGROUND
+
+DEBUG = True
+
+INDEX_USERS = 256
+INDEX_TTL = 3600
+# Neighbours less similar than this are not worth sending to the LLM
+MIN_SIMILARITY = float(os.getenv("MEMORY_MIN_SIMILARITY") or 0.1)
+
+VECTORS_SQL = '''
+    SELECT id, content, summary, tags, embedding, embedding_model
+    FROM longterm_memory
+    WHERE user_id = ?
+    ORDER BY id
+'''
+SAVE_VECTOR_SQL = "UPDATE longterm_memory SET embedding = ?, embedding_model = ? WHERE id = ?"
+
+
+class UserIndex:
+    def __init__(self, model: str, ids: np.ndarray, matrix: np.ndarray):
+        self.model = model
+        self.ids = ids
+        self.matrix = matrix
+
+    def add(self, memory_id: int, vector: np.ndarray):
+        self.ids = np.append(self.ids, np.int64(memory_id))
+        self.matrix = np.ascontiguousarray(np.vstack([self.matrix, vector[None, :]]), dtype=np.float32)
+
+    def search(self, query: np.ndarray, k: int, min_score: float = MIN_SIMILARITY) -> list:
+        if not len(self.ids) or query.shape[0] != self.matrix.shape[1]:
+            return []
+        scores = self.matrix @ query
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(self.ids[i]), float(scores[i])) for i in top if scores[i] >= min_score]
+
+
+_indexes = TTLCache(INDEX_USERS, INDEX_TTL)
+_loading = SingleFlight()
+_backfilling = SingleFlight()
+_background = set()  # keeps references to running backfill tasks
+# Bumped when a backfill lands so an index built before it is not cached
+_generation = {}
+
+
+def memory_text(content: str, summary: str, tags) -> str:
+    """The text that gets embedded for a memory."""
+    if isinstance(tags, str):
+        tags = json.loads(tags or "[]")
+    tags = " ".join(tags or [])
+    return " ".join(part for part in (content, summary, tags) if part)
+
+
+async def _backfill(user_id: str, model: str, stale: list):
+    if DEBUG:
+        start = time.perf_counter()
+    used, matrix = await embeddings.embed([
+        memory_text(row["content"], row["summary"], row["tags"]) for row in stale
+    ], BACKGROUND)
+    # If the configured model could not be reached, leave these rows out for now
+    # (full-text search still covers them) and try again on the next load.
+    if used != model:
+        return
+    await db.aexecutemany(SAVE_VECTOR_SQL, [
+        (embeddings.to_blob(vector), model, row["id"]) for row, vector in zip(stale, matrix)
+    ])
+    metrics.incr("vector_index.backfilled", len(stale))
+    # The next search rebuilds the index from the stored vectors, now including these
+    _generation[user_id] = _generation.get(user_id, 0) + 1
+    invalidate(user_id)
+    if DEBUG:
+        duration = time.perf_counter() - start
+        print(f"[DEBUG] embedded {len(stale)} memories for {user_id} in {duration:.2f}s")
+
+
+def _schedule_backfill(user_id: str, model: str, stale: list):
+    if _backfilling.in_flight(user_id):
+        return
+
+    async def run():
+        try:
+            await _backfilling.do(user_id, lambda: _backfill(user_id, model, stale))
+        except Exception as e:
+            print(f"Error embedding memories for {user_id}: {e}")
+
+    task = asyncio.create_task(run())
+    _background.add(task)
+    task.add_done_callback(_background.discard)
+
+
+async def _build(user_id: str) -> UserIndex:
+    """
+    Index the vectors already stored for the user. Rows without a current vector are embedded
+    in the background, so a first search never waits on the embedding model; until that
+    finishes those rows are only reachable through full-text search.
+    """
+    if DEBUG:
+        start = time.perf_counter()
+
+    model = embeddings.active_model()
+    rows = await db.afetchall(VECTORS_SQL, (user_id,))
+    vectors = {}
+    stale = []
+    for row in rows:
+        if row["embedding"] is not None and row["embedding_model"] == model:
+            vectors[row["id"]] = embeddings.from_blob(row["embedding"])
+        else:
+            stale.append(row)
+    if stale:
+        _schedule_backfill(user_id, model, stale)
+
+    ids = np.fromiter(vectors.keys(), dtype=np.int64, count=len(vectors))
+    if vectors:
+        matrix = np.ascontiguousarray(np.vstack(list(vectors.values())), dtype=np.float32)
+    else:
+        matrix = np.zeros((0, 0), dtype=np.float32)
+    index = UserIndex(model, ids, matrix)
+
+    if DEBUG:
+        duration = time.perf_counter() - start
+        print(f"[DEBUG] built vector index for {user_id}: {len(ids)} vectors ({len(stale)} queued for embedding) in {duration:.2f}s")
+    return index
+
+
+async def get_index(user_id: str) -> UserIndex:
+    index = _indexes.get(user_id)
+    if index is None:
+        generation = _generation.get(user_id, 0)
+        index = await _loading.do(user_id, lambda: _build(user_id))
+        if _generation.get(user_id, 0) == generation:
+            _indexes.set(user_id, index)
+    return index
+
+
+def add(user_id: str, memory_id: int, model: str, blob: bytes):
+    """Append a freshly inserted memory to the user's index, if it is loaded."""
+    index = _indexes.get(user_id)
+    if index is None:
+        return
+    vector = embeddings.from_blob(blob)
+    if model != index.model or (len(index.ids) and vector.shape[0] != index.matrix.shape[1]):
+        invalidate(user_id)
+    elif not len(index.ids):
+        index.ids = np.array([memory_id], dtype=np.int64)
+        index.matrix = np.ascontiguousarray(vector[None, :], dtype=np.float32)
+    else:
+        index.add(memory_id, vector)
+
+
+def invalidate(user_id: str):
+    _indexes.pop(user_id)
+
+
+async def search(user_id: str, query: str, k: int = 5) -> list:
+    """
+    Top-k (memory_id, cosine similarity) pairs for the query, best first.
+    """
+    index = await get_index(user_id)
+    if not len(index.ids):
+        return []
+    model, vector = await embeddings.embed_one(query)
+    if model != index.model:
+        return []
+    return index.search(vector, k)
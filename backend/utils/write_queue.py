@@ -0,0 +1,181 @@
+# alfred/backend/utils/write_queue.py
+
+import asyncio
+import sqlite3
+import time
+
+from utils import db
+
+DEBUG = True
+
+
+class WriteBehindQueue:
+    """
+    Buffers rows for a single INSERT statement and writes them in batches.
+    A batch is flushed when it reaches batch_size rows or when flush_interval
+    seconds have passed since its first row, whichever comes first. put() waits
+    when max_size rows are already pending, which applies backpressure to callers
+    instead of growing memory without bound. stop() drains everything still queued.
+    If a batch hits a constraint error its rows are written one by one, and the rows that
+    still conflict are passed to `await on_conflict(rows)`. It returns replacement rows
+    (e.g. with fresh ids), which are queued again behind everything already pending; a
+    replacement that conflicts again, or any row without on_conflict, is dropped. One bad row never costs the whole batch, and
+    no failed batch ends the writer.
+    """
+
+    def __init__(self, sql: str, name: str, batch_size: int = 64, flush_interval: float = 0.05,
+                 max_size: int = 1000, retries: int = 3, on_conflict=None):
+        self.sql = sql
+        self.name = name
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_size = max_size
+        self.retries = retries
+        self.on_conflict = on_conflict
+        self._queue = None
+        self._task = None
+        self._has_space = None
+        self._replacements = set()  # rows on_conflict handed back that haven't been written yet
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def start(self):
+        if self.running:
+            return
+        # Unbounded so the writer can always queue on_conflict's rows; callers are held at max_size by _wait_for_space
+        self._queue = asyncio.Queue()
+        self._has_space = asyncio.Event()
+        self._task = asyncio.create_task(self._run(), name=f"write-behind-{self.name}")
+
+    async def _wait_for_space(self):
+        while self._queue.qsize() >= self.max_size:
+            self._has_space.clear()
+            await self._has_space.wait()
+
+    async def put(self, row: tuple):
+        if not self.running:
+            # No background writer (e.g. scripts run outside the app); write straight through.
+            await db.aexecute(self.sql, row)
+            return
+        await self._wait_for_space()
+        self._queue.put_nowait(row)
+
+    async def put_ordered(self, make_row):
+        """
+        Queue make_row()'s row. make_row runs right before the row is queued, with no await in
+        between, so rows are queued (and written) in the order make_row was called; callers
+        waiting in put() may be woken in any order.
+        """
+        if not self.running:
+            await db.aexecute(self.sql, make_row())
+            return
+        await self._wait_for_space()
+        self._queue.put_nowait(make_row())
+
+    async def stop(self):
+        if not self.running:
+            return
+        self._queue.put_nowait(None)
+        await self._task
+        self._task = None
+
+    async def _run(self):
+        stopping = False
+        while not stopping:
+            row = await self._queue.get()
+            if row is None:
+                break
+            batch = [row]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                try:
+                    row = self._queue.get_nowait() if timeout <= 0 else await asyncio.wait_for(self._queue.get(), timeout)
+                except (asyncio.TimeoutError, asyncio.QueueEmpty):
+                    break
+                if row is None:
+                    stopping = True
+                    break
+                batch.append(row)
+            self._has_space.set()
+            await self._guarded_flush(batch)
+        # Rows on_conflict queued again after the stop marker was read
+        while not self._queue.empty():
+            batch = [self._queue.get_nowait() for _ in range(min(self.batch_size, self._queue.qsize()))]
+            await self._guarded_flush([row for row in batch if row is not None])
+
+    async def _guarded_flush(self, batch: list):
+        try:
+            await self._flush(batch)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"[ERROR] Dropping {len(batch)} {self.name} rows after an unexpected error: {e}")
+        finally:
+            if self._replacements:
+                # written, dropped or replaced again by now
+                self._replacements.difference_update(batch)
+
+    async def _flush(self, batch: list):
+        if not batch:
+            return
+        if DEBUG:
+            start = time.perf_counter()
+        conflicts, row_by_row, attempt = [], False, 0
+        while True:
+            try:
+                if row_by_row:
+                    conflicts = await db.run(self._write_rows, batch)
+                else:
+                    await db.aexecutemany(self.sql, batch)
+                break
+            except sqlite3.IntegrityError as e:
+                if not row_by_row:
+                    print(f"[ERROR] {self.name} batch of {len(batch)} rows hit a constraint, writing rows one by one: {e}")
+                    row_by_row = True
+                    continue
+                error = e
+            except Exception as e:
+                error = e
+            attempt += 1
+            print(f"[ERROR] {self.name} write-behind flush failed (attempt {attempt}): {error}")
+            if attempt == self.retries:
+                print(f"[ERROR] Dropping {len(batch)} {self.name} rows")
+                return
+            await asyncio.sleep(0.1 * attempt)
+        if conflicts:
+            await self._requeue(conflicts)
+        if DEBUG:
+            duration = time.perf_counter() - start
+            print(f"[DEBUG] {self.name} flushed {len(batch) - len(conflicts)} rows in {duration:.3f}s")
+
+    async def _requeue(self, conflicts: list):
+        # A replacement that conflicts again can't be fixed by on_conflict (e.g. NOT NULL, not a taken id)
+        dropped = conflicts if self.on_conflict is None else [row for row in conflicts if row in self._replacements]
+        if dropped:
+            print(f"[ERROR] Dropping {len(dropped)} {self.name} rows that violate a constraint")
+            conflicts = [row for row in conflicts if row not in dropped]
+        if not conflicts:
+            return
+        try:
+            replacements = await self.on_conflict(conflicts)
+        except Exception as e:
+            print(f"[ERROR] Dropping {len(conflicts)} {self.name} rows, on_conflict failed: {e}")
+            return
+        # No await between on_conflict returning and queueing, so the replacements keep their place in line
+        for row in replacements or ():
+            self._replacements.add(row)
+            self._queue.put_nowait(row)
+
+    def _write_rows(self, batch: list) -> list:
+        """Write the batch row by row in one transaction; returns the rows that violate a constraint."""
+        conflicts = []
+        with db.transaction() as conn:
+            for row in batch:
+                try:
+                    conn.execute(self.sql, row)
+                except sqlite3.IntegrityError:
+                    conflicts.append(row)
+        return conflicts
@@ -10,35 +10,45 @@ function Chat() {
   const [messages, setMessages] = useState([]);
   const [inputValue, setInputValue] = useState('');
   const [isLoading, setIsLoading] = useState(false);
+  const [pendingReplyId, setPendingReplyId] = useState(null);
   const messagesEndRef = useRef(null);
   const inputRef = useRef(null);
   const baseUrl = import.meta.env.VITE_API_BASE_URL;
 
   
 
-  const updateMessages = (newMessages) => {
-    const limitedMessages = newMessages.slice(-20); // keep only last 20
-    setMessages(limitedMessages); // Update the state with the limited messages
-    if (sessionId) {
-      localStorage.setItem(`messages_${sessionId}`, JSON.stringify(limitedMessages)); // Save the messages to localStorage
-    }
+  // Always update from the latest state: reminders can arrive while a reply is streaming.
+  // The effect below saves the result to localStorage.
+  const updateMessages = (update) => {
+    setMessages((prev) => update(prev).slice(-20)); // keep only last 20
   };
 
-  useEffect(() => {
-    const fetchHistory = async () => {
-      try {
-        const res = await fetch(`${baseUrl}/history?user_id=default`);
-        const data = await res.json();
-        if (data && Array.isArray(data)) {
-          setMessages(data); // Replace existing chat state with history
-        }
-      } catch (err) {
-        console.error("Failed to load chat history:", err);
+  // Add the streaming reply, or replace it in place once it's there
+  const upsertReply = (replyId, text) => {
+    updateMessages((prev) => (
+      prev.some((message) => message.id === replyId)
+        ? prev.map((message) => (message.id === replyId ? { ...message, text } : message))
+        : [...prev, { id: replyId, text, sender: 'ai' }]
+    ));
+  };
+
+  // Latest page of this session's history from /history, in the shape the chat window uses.
+  // The response has an ETag, so the browser revalidates instead of downloading it again.
+  const fetchHistory = async (storedUserId, storedSessionId) => {
+    try {
+      const params = new URLSearchParams({ user_id: storedUserId, session_id: storedSessionId, limit: 20 });
+      const res = await fetch(`${baseUrl}/history?${params}`);
+      const data = await res.json();
+      if (data && Array.isArray(data.messages)) {
+        setMessages(data.messages.map((row) => ({
+          text: row.content,
+          sender: row.role === 'user' ? 'user' : 'ai',
+        })));
       }
-    };
-  
-    fetchHistory();
-  }, []);
+    } catch (err) {
+      console.error("Failed to load chat history:", err);
+    }
+  };
 
   const scrollToBottom = () => {
     messagesEndRef.current?.scrollIntoView({ behavior: "smooth" });
@@ -66,12 +76,7 @@ function Chat() {
         setMessages(JSON.parse(savedMessages));
       } else {
         // fallback to history fetch
-        fetch(`${baseUrl}/history?user_id=${storedUserId}`)
-          .then((res) => res.json())
-          .then((data) => {
-            if (Array.isArray(data)) setMessages(data);
-          })
-          .catch((err) => console.error("Failed to load chat history:", err));
+        fetchHistory(storedUserId, storedSessionId);
       }
     }
   }, []);
@@ -90,11 +95,73 @@ function Chat() {
     scrollToBottom();
   }, [messages]);
 
+  // Pick up task reminders fired by the backend scheduler
+  useEffect(() => {
+    if (!userId) return;
+    const pollReminders = async () => {
+      try {
+        const res = await fetch(`${baseUrl}/reminders?user_id=${userId}`);
+        const reminders = await res.json();
+        if (Array.isArray(reminders) && reminders.length > 0) {
+          const reminderMessages = reminders.map((reminder) => ({
+            text: `Reminder: ${reminder.task} (due ${new Date(reminder.due_date).toLocaleString()})`,
+            sender: 'ai',
+          }));
+          // /reminders marks them delivered, so they must survive a reload too
+          updateMessages((prev) => [...prev, ...reminderMessages]);
+        }
+      } catch (err) {
+        console.error("Failed to load reminders:", err);
+      }
+    };
+    pollReminders();
+    const interval = setInterval(pollReminders, 60000);
+    return () => clearInterval(interval);
+  }, [userId]);
+
   const handleInputChange = (event) => {
     setInputValue(event.target.value);
   };
 
-  const sendMessageToAI = async (userMessage) => {
+  // Parse the Server-Sent Events coming back from /chat/stream.
+  // onToken is called with the reply so far each time alfred_node produces more text.
+  const readEventStream = async (response, onToken) => {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    let reply = '';
+
+    while (true) {
+      const { value, done } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+      const events = buffer.split('\n\n');
+      buffer = events.pop();
+
+      for (const rawEvent of events) {
+        let eventName = 'message';
+        let data = '';
+        for (const line of rawEvent.split('\n')) {
+          if (line.startsWith('event: ')) eventName = line.slice(7);
+          else if (line.startsWith('data: ')) data += line.slice(6);
+        }
+        if (!data) continue;
+        const payload = JSON.parse(data);
+
+        if (eventName === 'token') {
+          reply += payload.content;
+          onToken(reply);
+        } else if (eventName === 'done') {
+          reply = payload.response;
+        } else if (eventName === 'error') {
+          throw new Error(payload.detail);
+        }
+      }
+    }
+    return reply;
+  };
+
+  const sendMessageToAI = async (userMessage, onToken) => {
     if (!userId) {
       console.error('User ID not set');
       return;
@@ -102,11 +169,11 @@ function Chat() {
     const sessionId = localStorage.getItem('sessionId')
 
     try {
-      const response = await fetch(`${baseUrl}/chat`, {
+      const response = await fetch(`${baseUrl}/chat/stream`, {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
-          'Accept': 'application/json',
+          'Accept': 'text/event-stream',
         },
         body: JSON.stringify({
           content: userMessage,
@@ -121,8 +188,7 @@ function Chat() {
         throw new Error(`Server responded with ${response.status}: ${errorData.detail || 'Unknown error'}`);
       }
 
-      const data = await response.json();
-      return data.response;
+      return await readEventStream(response, onToken);
     } catch (error) {
       console.error('Error:', error);
       return 'Sorry, I encountered an error. Please try again.';
@@ -133,14 +199,19 @@ function Chat() {
     if (inputValue.trim() !== '') {
       // Add user message
       const userMessage = inputValue;
-      updateMessages([...messages, { text: userMessage, sender: 'user' }]);
+      const replyId = `reply-${Date.now()}`;
+      updateMessages((prev) => [...prev, { text: userMessage, sender: 'user' }]);
       setInputValue('');
       setIsLoading(true);
+      setPendingReplyId(replyId);
 
-      // Get AI response
-      const aiResponse = await sendMessageToAI(userMessage);
-      updateMessages([...messages, { text: userMessage, sender: 'user' }, { text: aiResponse, sender: 'ai' }]);
+      // Show Alfred's reply as it streams in
+      const aiResponse = await sendMessageToAI(userMessage, (partialReply) => {
+        upsertReply(replyId, partialReply);
+      });
+      upsertReply(replyId, aiResponse);
       setIsLoading(false);
+      setPendingReplyId(null);
       inputRef.current.focus();
     }
   };
@@ -184,7 +255,7 @@ function Chat() {
               </div>
             </div>
           ))}
-          {isLoading && (
+          {isLoading && !messages.some((message) => message.id === pendingReplyId) && (
             <div className="flex items-start">
               <div className="bg-[#905b29] text-white font-bold rounded-2xl rounded-tl-sm px-4 py-2">
                 Butlering...